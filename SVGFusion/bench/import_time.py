@@ -0,0 +1,86 @@
+from __future__ import annotations
+import argparse
+import json
+import subprocess
+import sys
+
+# NOTE: import 時間のベンチマーク (DataLoader の worker や CLI はプロセスを大量に起動するので import が遅いと効く)。
+# 各モジュールを新しいインタプリタで import し、所要時間 (repeat 回の最小値) と、import された重い依存を調べる。
+# torch は避けられないので `import torch` だけの時間も測り、差分 (SVGFusion 自身のコスト) を出す。
+# --check を付けると、重い依存が import される / 差分が --budget 秒を超える場合に終了コード 1 を返す (回帰検出用)。
+
+MODULES = [
+    "SVGFusion.svglib.svg",
+    "SVGFusion.svglib.serialize",
+    "SVGFusion.svglib.raster",
+    "SVGFusion.difflib.tensor",
+    "SVGFusion.difflib.loss",
+    "SVGFusion.difflib.dataset",
+    "SVGFusion.difflib.compact",
+]
+
+# imported only by the functions that need them (draw, animate, overlap_graph, to_shapely, plotting)
+HEAVY_MODULES = ["IPython", "cairosvg", "PIL", "moviepy", "networkx", "shapely", "matplotlib"]
+
+_SCRIPT = """
+import json, sys, time
+t = time.perf_counter()
+import {module}
+t = time.perf_counter() - t
+print(json.dumps({{"seconds": t, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module: str, repeat=3, python=sys.executable) -> dict:
+    """Import time of module in a fresh interpreter (min over repeat runs) and the heavy modules it pulls in."""
+    results = []
+    for _ in range(repeat):
+        out = subprocess.run([python, "-c", _SCRIPT.format(module=module, heavy=HEAVY_MODULES)],
+                             capture_output=True, text=True)
+        if out.returncode != 0:
+            return {"module": module, "error": out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "failed"}
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {"module": module, "seconds": min(r["seconds"] for r in results), "heavy": results[0]["heavy"]}
+
+
+def run(modules=None, repeat=3) -> dict:
+    baseline = measure("torch", repeat)
+    report = {"baseline": baseline, "modules": []}
+    for module in modules or MODULES:
+        result = measure(module, repeat)
+        if "seconds" in result and "seconds" in baseline:
+            result["over_baseline"] = result["seconds"] - baseline["seconds"]
+        report["modules"].append(result)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import time benchmark of SVGFusion modules.")
+    parser.add_argument("modules", nargs="*", help=f"modules to import (default: {' '.join(MODULES)})")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", default=None, help="write the report to this file")
+    parser.add_argument("--check", action="store_true", help="exit with 1 on heavy imports or if over --budget")
+    parser.add_argument("--budget", type=float, default=1.0, help="seconds allowed on top of `import torch`")
+    args = parser.parse_args(argv)
+
+    report = run(args.modules, args.repeat)
+    print(f"{'torch (baseline)':32s} {report['baseline'].get('seconds', float('nan')):7.3f}s")
+    failed = False
+    for r in report["modules"]:
+        if "error" in r:
+            print(f"{r['module']:32s} error: {r['error']}")
+            failed = True
+            continue
+        heavy = f"  heavy: {', '.join(r['heavy'])}" if r["heavy"] else ""
+        print(f"{r['module']:32s} {r['seconds']:7.3f}s (+{r.get('over_baseline', 0.):.3f}s){heavy}")
+        failed |= bool(r["heavy"]) or r.get("over_baseline", 0.) > args.budget
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=1)
+    if args.check and failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+from __future__ import annotations
+import argparse
+import copy
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import torch
+from typing import Callable, Dict, List
+from .synthetic import KINDS, synthetic_corpus
+
+# NOTE: SVG 処理のベンチマーク。合成コーパス (bench.synthetic) の文書の種類ごとに各処理を実行し、
+# 時間 (repeat 回の最小値と平均) と tracemalloc のピークメモリ (Python / numpy の確保分、torch の確保分は含まない) を JSON に記録する。
+#   from_str, canonicalize                          : 元の文書
+#   bbox, to_tensor                                 : canonicalize 後の文書 (弧を含むと多くの処理が未実装のため)
+#   simplify, split, overlap_graph, sample_points   : canonicalize 後の文書から path_commands の M を除いたもの
+#                                                     (SVGCommandMove には length / derivative がない。始点は start_command が持つ)
+#   from_tensor, sample_points.tensor               : canonicalize 後の to_tensor の行列
+#   loss.*                                          : パスごとの行列からサンプリングした点 (+ ノイズ) のバッチ、backward まで
+# 文書を書き換える処理は、計測の外で毎回 deepcopy した文書に対して実行する。
+# 例外は処理ごとに "error" として記録し、残りの処理は続ける (pathological 文書で落ちる処理も結果の一部)。
+# canonicalize できないパスは後段の入力から除く。ms/item は文書あたり (loss.* はパスあたり) の時間。
+# --compare baseline.json で、時間かメモリが --threshold 倍を超えた処理と、baseline では動いていたのに失敗する処理を回帰として表示し、
+# 終了コード 1 を返す。
+
+MIN_SECONDS = 1e-3   # shorter timings are too noisy to be compared
+SAMPLE_N = 10
+
+
+def _stack(matrices):
+    # (B, L, 19) padded batch and (B, L) mask
+    L = max(len(m) for m in matrices)
+    data = torch.full((len(matrices), L, matrices[0].size(-1)), -1.)
+    mask = torch.zeros(len(matrices), L, dtype=torch.bool)
+    for i, m in enumerate(matrices):
+        data[i, :len(m)], mask[i, :len(m)] = m, True
+    return data, mask
+
+
+class _Data:
+    """Inputs of the cases for the documents of one kind."""
+    def __init__(self, strings: List[str]):
+        from ..svglib.svg import SVG
+        self.strings = strings
+        self.svgs = [SVG.from_str(s) for s in strings]
+
+        # paths that can't be canonicalized (pathological ones) are left out of the later stages
+        self.canonical = [svg for svg in map(self._canonicalize, self.svgs) if svg is not None]
+        self.matrices = [svg.to_tensor() for svg in self.canonical]
+        self.path_matrices = [m for svg in self.canonical for m in svg.to_tensor(concat_groups=False)]
+        self.drawn = [svg for svg in map(self._drop_moves, self.canonical) if svg is not None]
+        self._points = None
+
+    @staticmethod
+    def _canonicalize(svg):
+        from ..svglib.svg import SVG
+        try:
+            return copy.deepcopy(svg).canonicalize()
+        except Exception:
+            groups = []
+            for group in svg.svg_path_groups:
+                try:
+                    groups.extend(SVG([copy.deepcopy(group)], viewbox=svg.viewbox).canonicalize().svg_path_groups)
+                except Exception:
+                    pass
+            return SVG(groups, viewbox=svg.viewbox) if groups else None
+
+    @staticmethod
+    def _drop_moves(svg):
+        # drawing commands only, paths left empty (a lone M) are dropped
+        from ..svglib.svg import SVG
+        from ..svglib.graphics.geometry.svg_command import SVGCommandMove
+        groups = []
+        for group in copy.deepcopy(svg).svg_path_groups:
+            for path in group.svg_paths:
+                path.path_commands = [c for c in path.path_commands if not isinstance(c, SVGCommandMove)]
+            group.svg_paths = [path for path in group.svg_paths if path.path_commands]
+            if group.svg_paths:
+                groups.append(group)
+        return SVG(groups, viewbox=svg.viewbox) if groups else None
+
+    @property
+    def points(self):
+        # padded (B, P, 2) sampled points of every path and a noisy copy, as (pred, target, lengths)
+        if self._points is None:
+            from ..difflib.sampling import sample_points
+            data, mask = _stack(self.path_matrices)
+            target, lengths = sample_points(data, n=SAMPLE_N, mask=mask)
+            g = torch.Generator().manual_seed(0)
+            pred = target + 0.1 * torch.randn(target.shape, generator=g)
+            self._points = pred, target, lengths
+        return self._points
+
+
+def _svg_cases() -> Dict[str, tuple]:
+    # name -> (prepare(data) -> args, run(args), number of documents / paths(data))
+    from ..svglib.svg import SVG
+    from ..difflib.tensor import SVGTensor
+    from ..difflib.sampling import sample_points
+    Index = SVGTensor.Index
+
+    def copies(attr):
+        return lambda data: copy.deepcopy(getattr(data, attr))
+
+    def same(attr):
+        return lambda data: getattr(data, attr)
+
+    def count(attr):
+        return lambda data: len(getattr(data, attr))
+
+    return {
+        "from_str": (same("strings"), lambda strings: [SVG.from_str(s) for s in strings], count("strings")),
+        "canonicalize": (copies("svgs"), lambda svgs: [svg.canonicalize() for svg in svgs], count("svgs")),
+        "simplify": (copies("drawn"), lambda svgs: [svg.simplify() for svg in svgs], count("drawn")),
+        "split": (copies("drawn"), lambda svgs: [svg.split(max_dist=1.) for svg in svgs], count("drawn")),
+        "bbox": (same("canonical"), lambda svgs: [svg.bbox() for svg in svgs], count("canonical")),
+        "overlap_graph": (same("drawn"), lambda svgs: [svg.overlap_graph() for svg in svgs], count("drawn")),
+        "to_tensor": (same("canonical"), lambda svgs: [svg.to_tensor() for svg in svgs], count("canonical")),
+        # SVGCommand.from_tensor reads the rows without the element column
+        "from_tensor": (same("matrices"),
+                        lambda matrices: [SVG.from_tensor(m[:, Index.COMMAND:Index.END_POS.stop]) for m in matrices],
+                        count("matrices")),
+        "sample_points": (same("drawn"),
+                          lambda svgs: [path.sample_points() for svg in svgs for path in svg.paths], count("drawn")),
+        "sample_points.tensor": (lambda data: _stack(data.matrices),
+                                 lambda args: sample_points(args[0], n=SAMPLE_N, mask=args[1]), count("matrices")),
+    }
+
+
+def _loss_cases() -> Dict[str, tuple]:
+    # forward and backward of every loss on the sampled points (the cost paid in training)
+    from ..difflib import loss
+
+    def prepare(data):
+        pred, target, lengths = data.points
+        return pred.clone().requires_grad_(), target, lengths
+
+    def batched(fn):
+        def run(args):
+            pred, target, lengths = args
+            mask = loss._as_mask(target, lengths)
+            fn(pred, target, mask, mask).sum().backward()
+        return run
+
+    def single(fn):
+        def run(args):
+            pred, target, lengths = args
+            total = sum(fn(p[:n], t[:n]) for p, t, n in zip(pred, target, lengths.tolist()))
+            total.backward()
+        return run
+
+    def suite(args):
+        pred, target, lengths = args
+        loss.svg_loss_suite(pred, target, lengths, lengths)["loss"].backward()
+
+    n_items = lambda data: len(data.path_matrices)
+    cases = {f"loss.{name}": (prepare, batched(fn), n_items) for name, fn in loss.BATCHED_LOSSES.items()}
+    cases["loss.suite"] = (prepare, suite, n_items)
+    for name, fn in [("chamfer", loss.chamfer_loss), ("continuity", lambda p, t: loss.continuity_loss(p)),
+                     ("length", loss.svg_length_loss), ("emd", loss.svg_emd_loss)]:
+        cases[f"loss.single.{name}"] = (prepare, single(fn), n_items)
+    return cases
+
+
+def all_cases() -> Dict[str, tuple]:
+    return {**_svg_cases(), **_loss_cases()}
+
+
+def measure(prepare: Callable, run: Callable, data, repeat=3, memory=True) -> dict:
+    """Best and mean time of run(prepare(data)) over repeat runs (prepare is not timed) and tracemalloc peak bytes."""
+    times = []
+    for _ in range(repeat):
+        args = prepare(data)
+        t = time.perf_counter()
+        run(args)
+        times.append(time.perf_counter() - t)
+    result = {"seconds": min(times), "mean_seconds": sum(times) / len(times)}
+
+    if memory:
+        args = prepare(data)
+        tracemalloc.start()
+        try:
+            run(args)
+            result["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def run(nb_docs=16, kinds=KINDS, cases=None, repeat=3, seed=0, memory=True, **params) -> dict:
+    """Report {"meta": ..., "results": {"kind/case": {...}}} of the cases (all_cases() by default)."""
+    available = all_cases()
+    cases = cases or list(available)
+    corpus = synthetic_corpus(nb_docs, kinds, seed, **params)
+
+    results = {}
+    for kind in kinds:
+        data = _Data([s for k, s in corpus if k == kind])
+        for name in cases:
+            prepare, fn, n_items = available[name]
+            key = f"{kind}/{name}"
+            try:
+                if not n_items(data):
+                    raise RuntimeError("nothing left after canonicalize")
+                results[key] = {"items": n_items(data), **measure(prepare, fn, data, repeat, memory)}
+            except Exception as e:
+                results[key] = {"error": f"{type(e).__name__}: {e}"}
+
+    meta = {"python": platform.python_version(), "torch": torch.__version__, "platform": platform.platform(),
+            "nb_docs": nb_docs, "seed": seed, "repeat": repeat, "params": params}
+    return {"meta": meta, "results": results}
+
+
+def compare(report: dict, baseline: dict, threshold=1.25, min_seconds=MIN_SECONDS) -> List[dict]:
+    """Regressions of report over baseline: new errors, time or peak memory over threshold times the baseline."""
+    regressions = []
+    for key, base in baseline["results"].items():
+        new = report["results"].get(key)
+        if new is None or "error" in base:
+            continue
+        if "error" in new:
+            regressions.append({"case": key, "metric": "error", "baseline": None, "value": new["error"]})
+            continue
+        if base["seconds"] >= min_seconds and new["seconds"] > threshold * base["seconds"]:
+            regressions.append({"case": key, "metric": "seconds", "baseline": base["seconds"], "value": new["seconds"]})
+        if base.get("peak_bytes") and new.get("peak_bytes", 0) > threshold * base["peak_bytes"]:
+            regressions.append({"case": key, "metric": "peak_bytes", "baseline": base["peak_bytes"], "value": new["peak_bytes"]})
+    return regressions
+
+
+def _print_report(report: dict, baseline: dict = None):
+    base_results = baseline["results"] if baseline is not None else {}
+    for key, r in report["results"].items():
+        if "error" in r:
+            print(f"{key:40s} error: {r['error']}")
+            continue
+        line = f"{key:40s} {r['seconds'] * 1e3:10.2f}ms {r['seconds'] * 1e3 / r['items']:9.3f}ms/item"
+        if "peak_bytes" in r:
+            line += f" {r['peak_bytes'] / 2 ** 20:8.2f}MiB"
+        base = base_results.get(key)
+        if base is not None and "seconds" in base:
+            line += f"  x{r['seconds'] / base['seconds']:.2f}"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark of the SVG operations and losses on a synthetic corpus.")
+    parser.add_argument("cases", nargs="*", help="cases to run (default: all)")
+    parser.add_argument("--kinds", nargs="+", default=list(KINDS), choices=KINDS)
+    parser.add_argument("--docs", type=int, default=16, help="documents of every kind")
+    parser.add_argument("--n-paths", type=int, default=None)
+    parser.add_argument("--n-commands", type=int, default=None)
+    parser.add_argument("--n-arcs", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run")
+    parser.add_argument("--json", default=None, help="write the report to this file")
+    parser.add_argument("--compare", default=None, help="baseline report, exit with 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=1.25, help="allowed ratio over the baseline")
+    args = parser.parse_args(argv)
+
+    unknown = set(args.cases) - set(all_cases())
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(sorted(unknown))}")
+
+    report = run(args.docs, args.kinds, args.cases, args.repeat, args.seed, not args.no_memory,
+                 n_paths=args.n_paths, n_commands=args.n_commands, n_arcs=args.n_arcs)
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    _print_report(report, baseline)
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=1)
+
+    if baseline is not None:
+        regressions = compare(report, baseline, args.threshold)
+        for r in regressions:
+            print(f"REGRESSION {r['case']} {r['metric']}: {r['baseline']} -> {r['value']}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
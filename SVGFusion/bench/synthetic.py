@@ -0,0 +1,155 @@
+from __future__ import annotations
+import math
+import numpy as np
+from typing import List, Sequence
+
+# NOTE: ベンチマーク用の合成 SVG コーパス (seed を固定すれば毎回同じ文書になる)。
+#   icon         : 少数の塗りつぶしパス (l / c / q / a の混在)
+#   glyph        : 黒一色の輪郭 + 内側の輪郭 (曲線が多い)
+#   map          : 格子状に並んだ多数の領域 (折れ線が多い)
+#   pathological : 長いパス、長さ 0 の線分・半径 0 の弧・大きすぎる弧、自己交差、極端に小さい座標
+# n_paths (パス数), n_commands (パスあたりの描画 command 数), n_arcs (そのうちの弧の数) で大きさを制御する。
+# パスは 1 つの輪郭 (M ... Z) だけを持つ。
+
+KINDS = ("icon", "glyph", "map", "pathological")
+
+DEFAULTS = {
+    "icon": dict(n_paths=4, n_commands=8, n_arcs=1),
+    "glyph": dict(n_paths=2, n_commands=24, n_arcs=0),
+    "map": dict(n_paths=48, n_commands=32, n_arcs=0),
+    "pathological": dict(n_paths=8, n_commands=256, n_arcs=64),
+}
+
+VIEWBOX = 24
+
+
+def _fmt(x) -> str:
+    return f"{x:.3f}".rstrip("0").rstrip(".")
+
+
+def _color(rng: np.random.Generator) -> str:
+    return "#{:02x}{:02x}{:02x}".format(*rng.integers(0, 256, 3))
+
+
+def _contour(rng: np.random.Generator, center, radius, n_commands, n_arcs, letters="lcq", jitter=0.3,
+             clockwise=True) -> str:
+    # closed contour of n_commands commands around center, n_arcs of them are arcs
+    n_commands = max(n_commands, 1)
+    theta = np.sort(rng.uniform(0, 2 * np.pi, n_commands))
+    if not clockwise:
+        theta = theta[::-1]
+    r = radius * (1 + jitter * rng.uniform(-1, 1, n_commands))
+    points = center + np.stack([r * np.cos(theta), r * np.sin(theta)], axis=-1)
+
+    kinds = rng.choice(list(letters), n_commands)
+    kinds[rng.choice(n_commands, min(n_arcs, n_commands), replace=False)] = "a"
+
+    d = [f"M{_fmt(points[-1, 0])} {_fmt(points[-1, 1])}"]
+    prev = points[-1]
+    for kind, p in zip(kinds, points):
+        x, y = _fmt(p[0]), _fmt(p[1])
+        if kind == "l":
+            d.append(f"L{x} {y}")
+        elif kind == "c":
+            c1, c2 = prev + (p - prev) / 3, prev + 2 * (p - prev) / 3
+            c1, c2 = c1 + rng.normal(0, radius / 4, 2), c2 + rng.normal(0, radius / 4, 2)
+            d.append(f"C{_fmt(c1[0])} {_fmt(c1[1])} {_fmt(c2[0])} {_fmt(c2[1])} {x} {y}")
+        elif kind == "q":
+            c = (prev + p) / 2 + rng.normal(0, radius / 4, 2)
+            d.append(f"Q{_fmt(c[0])} {_fmt(c[1])} {x} {y}")
+        else:
+            rx, ry = rng.uniform(0.3, 1., 2) * radius
+            d.append(f"A{_fmt(rx)} {_fmt(ry)} {_fmt(rng.uniform(0, 360))} {int(rng.integers(2))} {int(rng.integers(2))} {x} {y}")
+        prev = p
+    d.append("Z")
+    return " ".join(d)
+
+
+def _icon(rng, n_paths, n_commands, n_arcs):
+    paths = []
+    for _ in range(n_paths):
+        center = rng.uniform(6, VIEWBOX - 6, 2)
+        d = _contour(rng, center, rng.uniform(2, 6), n_commands, n_arcs)
+        paths.append((d, _color(rng)))
+    return paths
+
+
+def _glyph(rng, n_paths, n_commands, n_arcs):
+    # outer contour, then counters (holes) drawn in the other direction
+    center = np.full(2, VIEWBOX / 2) + rng.normal(0, 1, 2)
+    paths = [(_contour(rng, center, 9., n_commands, n_arcs, letters="cq", jitter=0.15), "#000000")]
+    for _ in range(n_paths - 1):
+        hole = center + rng.normal(0, 1.5, 2)
+        paths.append((_contour(rng, hole, rng.uniform(1.5, 3.), n_commands // 2, n_arcs // 2, letters="cq", jitter=0.15,
+                               clockwise=False), "#000000"))
+    return paths
+
+
+def _map(rng, n_paths, n_commands, n_arcs):
+    # regions on a jittered grid, boundaries are polylines
+    k = math.ceil(math.sqrt(n_paths))
+    cell = VIEWBOX / k
+    paths = []
+    for i in range(n_paths):
+        center = (np.array([i % k, i // k]) + 0.5) * cell + rng.normal(0, cell / 10, 2)
+        d = _contour(rng, center, cell / 2, n_commands, n_arcs, letters="l", jitter=0.2)
+        paths.append((d, _color(rng)))
+    return paths
+
+
+def _pathological(rng, n_paths, n_commands, n_arcs):
+    paths = []
+    for i in range(n_paths):
+        case = i % 4
+        if case == 0:
+            # long self-intersecting zig-zag
+            points = rng.uniform(0, VIEWBOX, (max(n_commands, 1), 2))
+            d = f"M{_fmt(points[0, 0])} {_fmt(points[0, 1])} " + " ".join(f"L{_fmt(x)} {_fmt(y)}" for x, y in points[1:]) + " Z"
+        elif case == 1:
+            # zero length segments and zero radius arcs
+            p = rng.uniform(0, VIEWBOX, 2)
+            x, y = _fmt(p[0]), _fmt(p[1])
+            commands = [f"A0 0 0 0 1 {x} {y}" if k < n_arcs else f"L{x} {y}" for k in range(n_commands)]
+            d = f"M{x} {y} " + " ".join(commands) + " Z"
+        elif case == 2:
+            # arcs with radii far too small (scaled up by the renderer) or far too large
+            theta = np.linspace(0, 2 * np.pi, max(n_commands, 1) + 1)
+            points = rng.uniform(4, VIEWBOX - 4, 2) + 3 * np.stack([np.cos(theta), np.sin(theta)], axis=-1)
+            commands = []
+            for k, (x, y) in enumerate(points[1:]):
+                if k < n_arcs:
+                    r = rng.choice([1e-3, 1e3])
+                    commands.append(f"A{_fmt(r)} {_fmt(r)} 0 {int(rng.integers(2))} {int(rng.integers(2))} {_fmt(x)} {_fmt(y)}")
+                else:
+                    commands.append(f"L{_fmt(x)} {_fmt(y)}")
+            d = f"M{_fmt(points[0, 0])} {_fmt(points[0, 1])} " + " ".join(commands) + " Z"
+        else:
+            # tiny contour close to the float precision of the viewbox
+            d = _contour(rng, rng.uniform(0, VIEWBOX, 2), 1e-3, n_commands, n_arcs, jitter=0.9)
+        paths.append((d, _color(rng)))
+    return paths
+
+
+_GENERATORS = {"icon": _icon, "glyph": _glyph, "map": _map, "pathological": _pathological}
+
+
+def synthetic_svg(kind="icon", n_paths=None, n_commands=None, n_arcs=None, seed=0) -> str:
+    """svg string of a synthetic document of kind (see KINDS), None parameters take the DEFAULTS of the kind."""
+    if kind not in _GENERATORS:
+        raise ValueError(f"Unknown document kind: {kind}")
+    params = dict(DEFAULTS[kind])
+    params.update({k: v for k, v in dict(n_paths=n_paths, n_commands=n_commands, n_arcs=n_arcs).items() if v is not None})
+
+    rng = np.random.default_rng(seed)
+    paths = _GENERATORS[kind](rng, **params)
+    body = "".join(f'<path fill="{fill}" d="{d}"/>' for d, fill in paths)
+    return f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {VIEWBOX} {VIEWBOX}">{body}</svg>'
+
+
+def synthetic_corpus(nb_docs=16, kinds: Sequence[str] = KINDS, seed=0, **params) -> List[tuple]:
+    """[(kind, svg string), ...], nb_docs documents of every kind. Document i of a kind has seed (seed, kind, i)."""
+    corpus = []
+    for kind in kinds:
+        for i in range(nb_docs):
+            corpus.append((kind, synthetic_svg(kind, seed=[seed, KINDS.index(kind), i], **params)))
+    return corpus
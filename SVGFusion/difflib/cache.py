@@ -0,0 +1,214 @@
+from __future__ import annotations
+import copy
+import hashlib
+import io
+import json
+import os
+import pickle
+import numpy as np
+import torch
+from multiprocessing import Pool
+from typing import List, Sequence
+from .compact import CompactSVGTensors, NB_COLUMNS
+from .utils import atomic_write
+
+# NOTE: 前処理パイプライン (canonicalize -> numericalize -> to_tensor) のディスクキャッシュ。
+# キー = 入力の内容ハッシュ (ファイルなら中身の sha1、SVG なら fingerprint) + そこまでの各ステージのパラメータ。
+# ステージ k の結果はステージ 1..k のパラメータだけに依存するので、後段のパラメータを変えても前段の結果は再利用される。
+#   to_tensor の結果   : compact 形式 (CompactSVGTensors, 整数でない値を含む場合は float32 の行列) の .npz
+#   途中の SVG          : pickle (.pkl)
+# キーには FORMAT_VERSION も含める (to_tensor / CompactSVGTensors / fingerprint の形式を変えたら上げて、古いエントリを使わないようにする)。
+# 書き込みは一時ファイル (mkstemp) + os.replace (並列に同じキーを書いても壊れない)。
+# 読み込み時に mtime を更新し、合計サイズが max_bytes を超えたら mtime の古い順に削除する (LRU)。
+
+STAGES = ("canonicalize", "numericalize")
+FORMAT_VERSION = 2
+LOW_WATERMARK = 0.9
+
+
+def content_hash(svg) -> str:
+    """sha1 of an svg file's bytes, or the fingerprint of an SVG object."""
+    if isinstance(svg, str):
+        h = hashlib.sha1()
+        with open(svg, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        return h.hexdigest()
+    return svg.fingerprint()
+
+
+def _is_numericalized(matrix: torch.Tensor) -> bool:
+    # 19 column layout with integral values (alpha excepted, it is quantized by CompactSVGTensors.pack)
+    if matrix.dim() != 2 or matrix.size(-1) != NB_COLUMNS:
+        return False
+    values = matrix[:, :NB_COLUMNS - 1]
+    return torch.equal(values, values.round())
+
+
+class PipelineCache:
+    """Content-addressed cache of pipeline stage results under root, bounded to max_bytes (LRU)."""
+    def __init__(self, root, max_bytes=1 << 30):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._size = None
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def key(content: str, stages: List[tuple]) -> str:
+        """Key of the result of stages [(name, params), ...] applied to the input of hash content."""
+        h = hashlib.sha1(f"{FORMAT_VERSION}:{content}".encode())
+        h.update(json.dumps(stages, sort_keys=True, default=str).encode())
+        return h.hexdigest()
+
+    def _path(self, key, ext):
+        return os.path.join(self.root, key[:2], key + ext)
+
+    def _files(self):
+        for dir_path, _, files in os.walk(self.root):
+            for f in files:
+                if not f.endswith(".tmp"):
+                    yield os.path.join(dir_path, f)
+
+    def _read(self, file_path):
+        try:
+            with open(file_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(file_path)  # LRU: recently used
+        except FileNotFoundError:
+            pass
+        return data
+
+    def _write(self, file_path, data: bytes):
+        # atomic write, concurrent writers of the same key never leave a partial file
+        atomic_write(file_path, lambda f: f.write(data))
+
+        if self._size is None:
+            self._size = self.nbytes
+        else:
+            self._size += len(data)
+        if self._size > self.max_bytes:
+            self.evict()
+
+    @property
+    def nbytes(self):
+        total = 0
+        for file_path in self._files():
+            try:
+                total += os.path.getsize(file_path)
+            except FileNotFoundError:
+                pass
+        return total
+
+    def evict(self, target=None):
+        """Remove least recently used entries until the cache holds at most target bytes (LOW_WATERMARK * max_bytes)."""
+        target = LOW_WATERMARK * self.max_bytes if target is None else target
+        entries = []
+        for file_path in self._files():
+            try:
+                st = os.stat(file_path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, file_path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, file_path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._size = total
+
+    def get_tensor(self, key) -> torch.Tensor:
+        data = self._read(self._path(key, ".npz"))
+        if data is None:
+            return None
+        with np.load(io.BytesIO(data)) as f:
+            if "matrix" in f.files:
+                return torch.from_numpy(f["matrix"])
+            arrays = [torch.from_numpy(f[k]) for k in ["header", "values", "row_offsets", "value_offsets"]]
+        return CompactSVGTensors(*arrays)[0]
+
+    def put_tensor(self, key, matrix: torch.Tensor):
+        f = io.BytesIO()
+        if _is_numericalized(matrix):
+            CompactSVGTensors.pack([matrix]).save(f)
+        else:
+            np.savez(f, matrix=matrix.detach().cpu().float().numpy())
+        self._write(self._path(key, ".npz"), f.getvalue())
+
+    def get_svg(self, key):
+        data = self._read(self._path(key, ".pkl"))
+        return pickle.loads(data) if data is not None else None
+
+    def put_svg(self, key, svg):
+        self._write(self._path(key, ".pkl"), pickle.dumps(svg, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def cached_to_tensor(svg, cache: PipelineCache, canonicalize: dict = None, numericalize: dict = None,
+                     to_tensor: dict = None) -> torch.Tensor:
+    """svg (SVG object or file path) -> canonicalize(**canonicalize) -> numericalize(**numericalize) -> to_tensor(**to_tensor).
+
+    A stage is skipped if its parameters are None. Only the stages after the last cached result are computed,
+    the input SVG object is never modified.
+    """
+    from ..svglib.svg import SVG
+    stages = [(name, params) for name, params in zip(STAGES, [canonicalize, numericalize]) if params is not None]
+    stages.append(("to_tensor", to_tensor or {}))
+    content = content_hash(svg)
+    keys = [cache.key(content, stages[:k + 1]) for k in range(len(stages))]
+
+    matrix = cache.get_tensor(keys[-1])
+    if matrix is not None:
+        return matrix
+
+    # resume from the last cached intermediate SVG
+    doc, start = None, 0
+    for k in reversed(range(len(stages) - 1)):
+        doc = cache.get_svg(keys[k])
+        if doc is not None:
+            start = k + 1
+            break
+    if doc is None:
+        doc = SVG.load_svg(svg) if isinstance(svg, str) else copy.deepcopy(svg)
+
+    for k in range(start, len(stages) - 1):
+        name, params = stages[k]
+        getattr(doc, name)(**params)
+        cache.put_svg(keys[k], doc)
+
+    matrix = doc.to_tensor(**stages[-1][1]).float()
+    cache.put_tensor(keys[-1], matrix)
+    return matrix
+
+
+_worker_cache = None
+
+
+def _init_worker(root, max_bytes):
+    # one cache per worker process (keeps its size estimate between jobs)
+    global _worker_cache
+    _worker_cache = PipelineCache(root, max_bytes)
+
+
+def _cached_to_tensor(args):
+    svg, stage_params = args
+    return cached_to_tensor(svg, _worker_cache, **stage_params).numpy()
+
+
+def cached_to_tensors(svgs: Sequence, root, max_bytes=1 << 30, num_workers=0, chunksize=16, **stage_params) -> List[torch.Tensor]:
+    """cached_to_tensor over many SVG objects / svg files, in a process pool if num_workers > 0 (order is preserved)."""
+    jobs = [(svg, stage_params) for svg in svgs]
+    if num_workers > 0:
+        with Pool(num_workers, initializer=_init_worker, initargs=(root, max_bytes)) as pool:
+            matrices = pool.map(_cached_to_tensor, jobs, chunksize=chunksize)
+        return [torch.from_numpy(m) for m in matrices]
+
+    cache = PipelineCache(root, max_bytes)
+    return [cached_to_tensor(svg, cache, **params) for svg, params in jobs]
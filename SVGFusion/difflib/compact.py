@@ -0,0 +1,205 @@
+from __future__ import annotations
+import numpy as np
+import torch
+from typing import List, Union
+from .tensor import SVGTensor, SVGTensorBatch
+
+# NOTE: numericalize 済み S_(i,j) のコンパクト形式
+# header (N,) uint8 : 行の種類 kind (下位4bit) | RGBA あり (0x40) | start_pos を明示保存 (0x80)
+#   kind = command (path 要素), len(PATH_COMMANDS) + element (それ以外)
+# values (V,) uint8/int16 : 各行の有効スロットの値だけを行順に連結したもの
+#   path 要素: CMD_ARGS_MASK のスロット (+ end_pos)。start_pos は SVGTensor と同じく前の行の end_pos から復元し、
+#   一致しない行だけ明示保存する。alpha は 0~255 に量子化する。
+# row_offsets / value_offsets (B+1,) : 各サンプルの先頭行・先頭値
+
+NB_COLUMNS = SVGTensor.Index.RGBA.stop
+VALUE_COLS = slice(SVGTensor.Index.RADIUS.start, NB_COLUMNS)
+NB_VALUES = VALUE_COLS.stop - VALUE_COLS.start
+NB_KINDS = len(SVGTensor.PATH_COMMANDS) + len(SVGTensor.ELEMENTS)
+
+HAS_RGBA = 0x40
+HAS_START_POS = 0x80
+KIND_MASK = 0x3f
+
+ALPHA_SCALE = 255.
+
+
+def _cols(*slices) -> List[int]:
+    cols = []
+    for s in slices:
+        cols.extend(range(s.start, s.stop) if isinstance(s, slice) else [s])
+    return cols
+
+
+def _slot_masks() -> torch.Tensor:
+    """(NB_KINDS, NB_COLUMNS) columns stored for every row kind (without start_pos of path rows and RGBA)."""
+    Index = SVGTensor.Index
+    masks = torch.zeros(NB_KINDS, NB_COLUMNS, dtype=torch.bool)
+
+    # path commands: CMD_ARGS_MASK slots, end_pos is always kept (z) so that the next start_pos can be derived
+    args_cols = _cols(Index.RADIUS, Index.X_AXIS_ROT, Index.LARGE_ARC_FLG, Index.SWEEP_FLG,
+                      Index.CONTROL1, Index.CONTROL2, Index.END_POS)
+    masks[:len(SVGTensor.PATH_COMMANDS), args_cols] = SVGTensor.CMD_ARGS_MASK.bool()
+    masks[:len(SVGTensor.PATH_COMMANDS), Index.END_POS] = True
+
+    # other elements, same columns as the svg_primitives to_tensor methods
+    layouts = {
+        "rect": _cols(Index.START_POS, Index.CONTROL1, Index.CONTROL2),
+        "circle": _cols(Index.RADIUS, Index.START_POS),
+        "ellipse": _cols(Index.RADIUS, Index.START_POS),
+        "line": _cols(Index.START_POS, Index.END_POS),
+        "polyline": _cols(Index.START_POS, Index.END_POS),
+        "polygon": _cols(Index.START_POS, Index.END_POS),
+    }
+    for element, cols in layouts.items():
+        masks[len(SVGTensor.PATH_COMMANDS) + SVGTensor.ELEMENTS.index(element), cols] = True
+    return masks
+
+
+SLOT_MASKS = _slot_masks()
+
+
+def _derived_start_pos(data, first_rows):
+    # start_pos as in SVGTensor.start_pos: end_pos of the previous row, 0 on the first row of every sample
+    Index = SVGTensor.Index
+    start_pos = torch.cat([data.new_zeros(1, 2), data[:-1, Index.END_POS]])
+    start_pos[first_rows] = 0
+    return start_pos
+
+
+class CompactSVGTensors:
+    """Compact storage of many numericalized S_(i,j) matrices (see the NOTE above for the format).
+
+    Use pack / unpack to convert from / to the 19-wide layout; both are vectorized over all rows.
+    """
+    def __init__(self, header: torch.Tensor, values: torch.Tensor, row_offsets: torch.Tensor, value_offsets: torch.Tensor,
+                 PAD_VAL=-1, ARGS_DIM=256):
+        self.header = header
+        self.values = values
+        self.row_offsets = row_offsets
+        self.value_offsets = value_offsets
+
+        self.PAD_VAL = PAD_VAL
+        self.ARGS_DIM = ARGS_DIM
+
+    @staticmethod
+    def pack(samples: List[Union[SVGTensor, torch.Tensor]], dtype=None, PAD_VAL=-1, ARGS_DIM=256) -> CompactSVGTensors:
+        """Pack SVGTensor or (L, 19) matrices.
+
+        Args:
+            dtype: torch.uint8 or torch.int16; the smallest one holding every value if None.
+
+        Raises:
+            ValueError: on non integral values (SVG.numericalize first), values out of range of dtype,
+                or values in columns that are not stored for their row kind.
+        """
+        matrices = [s.matrix[:int(s.seq_len)] if isinstance(s, SVGTensor) else s for s in samples]
+        lengths = torch.tensor([m.size(0) for m in matrices], dtype=torch.long)
+        row_offsets = torch.cat([lengths.new_zeros(1), lengths.cumsum(0)])
+        data = torch.cat([m.float() for m in matrices]) if matrices else torch.empty(0, NB_COLUMNS)
+        if data.size(-1) != NB_COLUMNS:
+            raise ValueError(f"Invalid tensor row length: {data.size(-1)}. Expected {NB_COLUMNS}.")
+
+        Index = SVGTensor.Index
+        elements, commands = data[:, Index.ELEMENT].long(), data[:, Index.COMMAND].long()
+        is_path = (elements == SVGTensor.ELEMENTS.index("path")) & (commands >= 0)
+        kinds = torch.where(is_path, commands, len(SVGTensor.PATH_COMMANDS) + elements)
+
+        first_rows = row_offsets[:-1][lengths > 0]
+        explicit_start = is_path & (data[:, Index.START_POS] != _derived_start_pos(data, first_rows)).any(dim=-1)
+        has_rgba = (data[:, Index.RGBA] != PAD_VAL).any(dim=-1)
+
+        slots = SLOT_MASKS[kinds]
+        slots[:, Index.START_POS] |= explicit_start.unsqueeze(-1)
+        slots[:, Index.RGBA] = has_rgba.unsqueeze(-1)
+
+        present = data != PAD_VAL
+        present[:, :VALUE_COLS.start] = False
+        present[is_path, Index.START_POS] = False  # derived or explicitly stored
+        if (present & ~slots).any():
+            raise ValueError("Values in columns not stored for their element/command (see compact.SLOT_MASKS).")
+
+        # alpha is quantized to 0~255 (numericalize never quantizes it), everything else must already be integral
+        data = data.clone()
+        alpha = data[:, Index.RGBA.stop - 1]
+        data[:, Index.RGBA.stop - 1] = torch.where(has_rgba, (alpha * ALPHA_SCALE).round(), alpha)
+        values = data[slots]
+        if not torch.equal(values, values.round()):
+            raise ValueError("Non integral values, numericalize the SVG first.")
+
+        if dtype is None:
+            dtype = torch.uint8 if values.numel() == 0 or (values.min() >= 0 and values.max() <= 255) else torch.int16
+        info = torch.iinfo(dtype)
+        if values.numel() and (values.min() < info.min or values.max() > info.max):
+            raise ValueError(f"Values out of range of {dtype}: [{values.min()}, {values.max()}].")
+
+        header = kinds | torch.where(has_rgba, HAS_RGBA, 0) | torch.where(explicit_start, HAS_START_POS, 0)
+        nb_values = torch.zeros(len(matrices), dtype=torch.long).index_add_(
+            0, torch.repeat_interleave(torch.arange(len(matrices)), lengths), slots.sum(dim=-1))
+        value_offsets = torch.cat([nb_values.new_zeros(1), nb_values.cumsum(0)])
+        return CompactSVGTensors(header.to(torch.uint8), values.to(dtype), row_offsets, value_offsets,
+                                 PAD_VAL=PAD_VAL, ARGS_DIM=ARGS_DIM)
+
+    def _unpack_rows(self, header, values, row_offsets):
+        # (N, 19) rows of the samples delimited by row_offsets (relative to header)
+        Index = SVGTensor.Index
+        header = header.long()
+        kinds = header & KIND_MASK
+        is_path = kinds < len(SVGTensor.PATH_COMMANDS)
+        explicit_start = (header & HAS_START_POS) > 0
+
+        slots = SLOT_MASKS.to(header.device)[kinds]
+        slots[:, Index.START_POS] |= explicit_start.unsqueeze(-1)
+        slots[:, Index.RGBA] = ((header & HAS_RGBA) > 0).unsqueeze(-1)
+
+        data = torch.full((header.size(0), NB_COLUMNS), float(self.PAD_VAL), device=header.device)
+        data[slots] = values.float()
+        data[:, Index.RGBA.stop - 1] = torch.where(slots[:, Index.RGBA.stop - 1], data[:, Index.RGBA.stop - 1] / ALPHA_SCALE,
+                                                    data[:, Index.RGBA.stop - 1])
+        data[:, Index.ELEMENT] = torch.where(is_path, SVGTensor.ELEMENTS.index("path"), kinds - len(SVGTensor.PATH_COMMANDS)).float()
+        data[:, Index.COMMAND] = torch.where(is_path, kinds, self.PAD_VAL).float()
+
+        # end_pos is complete at this point, so derived start_pos are the same as in pack
+        derived = is_path & ~explicit_start
+        lengths = row_offsets[1:] - row_offsets[:-1]
+        start_pos = _derived_start_pos(data, row_offsets[:-1][lengths > 0])
+        data[:, Index.START_POS] = torch.where(derived.unsqueeze(-1), start_pos, data[:, Index.START_POS])
+        return data
+
+    def __len__(self):
+        return self.row_offsets.size(0) - 1
+
+    def __getitem__(self, idx) -> torch.Tensor:
+        """(L, 19) matrix of sample idx."""
+        r0, r1 = int(self.row_offsets[idx]), int(self.row_offsets[idx + 1])
+        v0, v1 = int(self.value_offsets[idx]), int(self.value_offsets[idx + 1])
+        return self._unpack_rows(self.header[r0:r1], self.values[v0:v1], self.row_offsets.new_tensor([0, r1 - r0]))
+
+    def unpack(self) -> List[torch.Tensor]:
+        """All samples as (L, 19) matrices."""
+        data = self._unpack_rows(self.header, self.values, self.row_offsets)
+        return list(data.split((self.row_offsets[1:] - self.row_offsets[:-1]).tolist()))
+
+    def to_batch(self) -> SVGTensorBatch:
+        """All samples as a padded SVGTensorBatch."""
+        return SVGTensorBatch.from_tensors(self.unpack(), PAD_VAL=self.PAD_VAL, ARGS_DIM=self.ARGS_DIM)
+
+    def to(self, device=None, dtype=None):
+        """Move every tensor to device. dtype (torch.uint8 or torch.int16) only applies to the values."""
+        header, row_offsets, value_offsets = (t.to(device) for t in [self.header, self.row_offsets, self.value_offsets])
+        return CompactSVGTensors(header, self.values.to(device=device, dtype=dtype), row_offsets, value_offsets,
+                                 PAD_VAL=self.PAD_VAL, ARGS_DIM=self.ARGS_DIM)
+
+    @property
+    def nbytes(self):
+        return sum(t.element_size() * t.numel() for t in [self.header, self.values, self.row_offsets, self.value_offsets])
+
+    def save(self, file_path):
+        np.savez(file_path, header=self.header.cpu().numpy(), values=self.values.cpu().numpy(),
+                 row_offsets=self.row_offsets.cpu().numpy(), value_offsets=self.value_offsets.cpu().numpy())
+
+    @staticmethod
+    def load(file_path, PAD_VAL=-1, ARGS_DIM=256) -> CompactSVGTensors:
+        with np.load(file_path) as f:
+            return CompactSVGTensors(*(torch.from_numpy(f[k]) for k in ["header", "values", "row_offsets", "value_offsets"]),
+                                     PAD_VAL=PAD_VAL, ARGS_DIM=ARGS_DIM)
@@ -0,0 +1,171 @@
+from __future__ import annotations
+import bisect
+import json
+import os
+import numpy as np
+import torch
+import torch.utils.data
+from multiprocessing import Pool
+from typing import Iterable, List, Union
+from .tensor import SVGTensor
+from .utils import atomic_write
+
+# NOTE: シャード形式
+# root/index.json                 : シャード一覧とサンプル数
+# root/shard_00000.npy            : 全サンプルを連結した (total_rows, 19) 配列
+# root/shard_00000.offsets.npy    : (num_samples + 1,) 各サンプルの開始行
+# np.load(mmap_mode="r") (np.memmap) で開くので、DataLoaderのworker間でページキャッシュを共有できる
+
+INDEX_FILE = "index.json"
+
+
+def _shard_names(k):
+    return f"shard_{k:05d}.npy", f"shard_{k:05d}.offsets.npy"
+
+
+def _save_npy(file_path, array):
+    # atomic write: readers never see a partially written shard, concurrent writers don't share a temporary file
+    atomic_write(file_path, lambda f: np.save(f, array))
+
+
+class ShardWriter:
+    """Writes (L, dim) matrices into flat .npy shards of `shard_size` samples. dim is taken from the first matrix if None."""
+    def __init__(self, root, shard_size=10000, dim=None, dtype=np.float32):
+        self.root = root
+        self.shard_size = shard_size
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+
+        self.shards = []
+        self._buffer = []
+        os.makedirs(root, exist_ok=True)
+
+    def add(self, matrix: Union[np.ndarray, torch.Tensor]):
+        if isinstance(matrix, torch.Tensor):
+            matrix = matrix.detach().cpu().numpy()
+        if self.dim is None and matrix.ndim == 2:
+            self.dim = matrix.shape[1]
+        if matrix.ndim != 2 or matrix.shape[1] != self.dim:
+            raise ValueError(f"Invalid matrix shape: {matrix.shape}. Expected (L, {self.dim}).")
+        self._buffer.append(matrix.astype(self.dtype, copy=False))
+
+        if len(self._buffer) >= self.shard_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        data_name, offsets_name = _shard_names(len(self.shards))
+        offsets = np.zeros(len(self._buffer) + 1, dtype=np.int64)
+        np.cumsum([len(m) for m in self._buffer], out=offsets[1:])
+
+        _save_npy(os.path.join(self.root, data_name), np.concatenate(self._buffer, axis=0))
+        _save_npy(os.path.join(self.root, offsets_name), offsets)
+
+        self.shards.append({"data": data_name, "offsets": offsets_name,
+                            "num_samples": len(self._buffer), "num_rows": int(offsets[-1])})
+        self._buffer = []
+
+    def close(self):
+        self.flush()
+        index = {"dim": self.dim, "dtype": self.dtype.name, "shards": self.shards}
+        atomic_write(os.path.join(self.root, INDEX_FILE), lambda f: json.dump(index, f, indent=1), mode="w")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+
+def _svg_to_matrix(args):
+    svg, to_tensor_kwargs = args
+    from ..svglib.svg import SVG
+    if isinstance(svg, str):
+        svg = SVG.load_svg(svg)
+    return svg.to_tensor(**to_tensor_kwargs).float().numpy()
+
+
+def write_svg_shards(svgs: Iterable, root, shard_size=10000, num_workers=0, chunksize=64, **to_tensor_kwargs):
+    """Convert SVG objects (or svg file paths) with SVG.to_tensor and write them as shards.
+
+    Conversion runs in a process pool when num_workers > 0; sample order is preserved.
+
+    Returns:
+        int: number of written samples.
+    """
+    jobs = ((svg, to_tensor_kwargs) for svg in svgs)
+    nb_samples = 0
+    with ShardWriter(root, shard_size=shard_size) as writer:
+        if num_workers > 0:
+            with Pool(num_workers) as pool:
+                for matrix in pool.imap(_svg_to_matrix, jobs, chunksize=chunksize):
+                    writer.add(matrix)
+                    nb_samples += 1
+        else:
+            for matrix in map(_svg_to_matrix, jobs):
+                writer.add(matrix)
+                nb_samples += 1
+    return nb_samples
+
+
+class SVGTensorDataset(torch.utils.data.Dataset):
+    """Dataset over shards written by ShardWriter / write_svg_shards.
+
+    Shards are memory-mapped lazily in each process, so DataLoader workers share the OS page cache instead of
+    holding copies of the data.
+    """
+    def __init__(self, root, return_svg_tensor=True, PAD_VAL=-1, ARGS_DIM=256):
+        self.root = root
+        self.return_svg_tensor = return_svg_tensor
+        self.PAD_VAL = PAD_VAL
+        self.ARGS_DIM = ARGS_DIM
+
+        with open(os.path.join(root, INDEX_FILE)) as f:
+            self.index = json.load(f)
+        self.cum_samples = np.cumsum([0] + [shard["num_samples"] for shard in self.index["shards"]]).tolist()
+
+        self._data = None
+        self._offsets = None
+
+    def __getstate__(self):
+        # do not pickle open memmaps into worker processes
+        state = self.__dict__.copy()
+        state["_data"] = state["_offsets"] = None
+        return state
+
+    def _open(self):
+        self._data = [np.load(os.path.join(self.root, shard["data"]), mmap_mode="r") for shard in self.index["shards"]]
+        self._offsets = [np.load(os.path.join(self.root, shard["offsets"])) for shard in self.index["shards"]]
+
+    def __len__(self):
+        return self.cum_samples[-1]
+
+    def _locate(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(f"Index {idx} out of range for dataset of size {len(self)}")
+        shard = bisect.bisect_right(self.cum_samples, idx) - 1
+        return shard, idx - self.cum_samples[shard]
+
+    def get_matrix(self, idx) -> torch.Tensor:
+        if self._data is None:
+            self._open()
+        shard, i = self._locate(idx)
+        start, end = self._offsets[shard][i], self._offsets[shard][i + 1]
+        return torch.from_numpy(np.array(self._data[shard][start:end], dtype=np.float32))
+
+    def __getitem__(self, idx):
+        matrix = self.get_matrix(idx)
+        if self.return_svg_tensor:
+            return SVGTensor.from_data(matrix, PAD_VAL=self.PAD_VAL, ARGS_DIM=self.ARGS_DIM)
+        return matrix
+
+    @property
+    def lengths(self) -> List[int]:
+        # seq_len of every sample, read from the offsets only (for BucketBatchSampler)
+        if self._offsets is None:
+            self._open()
+        return np.concatenate([np.diff(offsets) for offsets in self._offsets]).tolist() if self._offsets else []
@@ -0,0 +1,95 @@
+from __future__ import annotations
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from typing import Union
+from .tensor import SVGTensor, SVGTensorBatch
+from .utils import positional_encoding
+
+# NOTE: S_(i,j) の各列を離散化して埋め込み、一回の embedding_bag (gather + sum) で要素埋め込みを作る。
+# 各列は専用のテーブル範囲を持つ（全列で一つの重み行列を共有し、列ごとにオフセットをずらす）。
+# PAD_VAL の列は per_sample_weights = 0 で無視する。
+
+
+class SVGElementEmbedding(nn.Module):
+    """Embedding of (B, L, 19) S_(i,j) matrices.
+
+    Every column is quantized to a bin: element and command ids, ARGS_DIM coordinate/radius bins, degrees of the
+    x-axis rotation mapped to ARGS_DIM bins, arc flags and n_colors RGBA bins (alpha in [0, 1] is rescaled). Bins of all
+    columns live in one table, so the embedding is a single fused gather-and-sum (F.embedding_bag).
+
+    Args:
+        d_model (int): Embedding dimension.
+        ARGS_DIM (int): Number of coordinate bins (SVG.numericalize(n=ARGS_DIM)).
+        n_colors (int): Number of color bins per channel.
+        learned (bool): Learned tables; otherwise fixed sinusoidal tables (frozen).
+        with_positional (bool): Add the sinusoidal positional encoding.
+    """
+    def __init__(self, d_model, ARGS_DIM=256, n_colors=256, learned=True, with_positional=True, PAD_VAL=-1):
+        super().__init__()
+        self.d_model = d_model
+        self.ARGS_DIM = ARGS_DIM
+        self.n_colors = n_colors
+        self.learned = learned
+        self.with_positional = with_positional
+        self.PAD_VAL = PAD_VAL
+
+        Index = SVGTensor.Index
+        sizes = [0] * 19
+        sizes[Index.ELEMENT] = len(SVGTensor.ELEMENTS)
+        sizes[Index.COMMAND] = len(SVGTensor.PATH_COMMANDS)
+        for col in [*range(Index.RADIUS.start, Index.RADIUS.stop), Index.X_AXIS_ROT,
+                    *range(Index.START_POS.start, Index.END_POS.stop)]:
+            sizes[col] = ARGS_DIM
+        sizes[Index.LARGE_ARC_FLG] = sizes[Index.SWEEP_FLG] = 2
+        for col in range(Index.RGBA.start, Index.RGBA.stop):
+            sizes[col] = n_colors
+
+        sizes = torch.tensor(sizes)
+        self.register_buffer("sizes", sizes, persistent=False)
+        self.register_buffer("offsets", torch.cat([sizes.new_zeros(1), sizes.cumsum(0)[:-1]]), persistent=False)
+        num_embeddings = int(sizes.sum())
+
+        if learned:
+            self.weight = nn.Parameter(torch.randn(num_embeddings, d_model) * d_model ** -0.5)
+        else:
+            self.register_buffer("weight", positional_encoding(num_embeddings, d_model).clone())
+
+    def quantize(self, data: torch.Tensor):
+        """Bin indices into the fused table and per-column weights (0 on PAD_VAL columns), both (..., 19)."""
+        Index = SVGTensor.Index
+        values = data.float()
+        valid = values != self.PAD_VAL
+
+        scaled = values.clone()
+        scaled[..., Index.X_AXIS_ROT] = torch.remainder(values[..., Index.X_AXIS_ROT], 360.) * self.ARGS_DIM / 360.
+        scaled[..., Index.RGBA.stop - 1] = values[..., Index.RGBA.stop - 1] * (self.n_colors - 1)
+
+        bins = scaled.round().long()
+        # angles rounding up to 360° wrap to bin 0, not to the last bin
+        bins[..., Index.X_AXIS_ROT] = bins[..., Index.X_AXIS_ROT].remainder(self.ARGS_DIM)
+        bins = bins.clamp(min=0)
+        bins = torch.minimum(bins, self.sizes.to(bins.device) - 1)
+        indices = torch.where(valid, bins + self.offsets.to(bins.device), torch.zeros_like(bins))
+        return indices, valid.to(self.weight.dtype)
+
+    def forward(self, data: Union[torch.Tensor, SVGTensorBatch], positions=None):
+        """data: (L, 19), (B, L, 19) or an SVGTensorBatch (its packed positions are used). Returns (..., L, d_model)."""
+        if isinstance(data, SVGTensorBatch):
+            positions = data.positions if positions is None else positions
+            data = data.data
+
+        shape = data.shape[:-1]
+        indices, weights = self.quantize(data)
+        out = F.embedding_bag(indices.reshape(-1, indices.size(-1)), self.weight,
+                              per_sample_weights=weights.reshape(-1, weights.size(-1)), mode="sum")
+        out = out.reshape(*shape, self.d_model)
+
+        if self.with_positional:
+            out = out + positional_encoding(shape[-1], self.d_model, positions=positions, dtype=out.dtype, device=out.device)
+        return out
+
+    @torch.no_grad()
+    def cache_features(self, batches, dtype=torch.float16):
+        """Embed an iterable of batches for preprocessing-time feature caching. Returns a list of (B, L, d_model)."""
+        return [self(batch).to(dtype) for batch in batches]
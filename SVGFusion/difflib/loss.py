@@ -1,10 +1,80 @@
-import numpy as np
 from .utils import *
 
 
-def chamfer_loss(x, y):
-    d = torch.cdist(x, y)
-    return d.min(dim=0).values.mean() + d.min(dim=1).values.mean()
+CHAMFER_MAX_MEMORY = 2 ** 28  # bytes per distance block
+
+
+@torch.no_grad()
+def _nearest_neighbors(x, y, x_mask=None, y_mask=None, chunk_size=1024):
+    # Streams (chunk_size x chunk_size) distance blocks and keeps running minima: nearest y of every x and vice versa
+    B, N, M = x.size(0), x.size(1), y.size(1)
+    row_min, row_arg = x.new_full((B, N), float("inf")), torch.zeros(B, N, dtype=torch.long, device=x.device)
+    col_min, col_arg = y.new_full((B, M), float("inf")), torch.zeros(B, M, dtype=torch.long, device=x.device)
+
+    for i in range(0, N, chunk_size):
+        x_chunk = x[:, i:i+chunk_size]
+        for j in range(0, M, chunk_size):
+            d = torch.cdist(x_chunk, y[:, j:j+chunk_size])
+            if x_mask is not None:
+                d.masked_fill_(~x_mask[:, i:i+chunk_size, None], float("inf"))
+            if y_mask is not None:
+                d.masked_fill_(~y_mask[:, None, j:j+chunk_size], float("inf"))
+
+            values, indices = d.min(dim=2)
+            better = values < row_min[:, i:i+chunk_size]
+            row_min[:, i:i+chunk_size] = torch.where(better, values, row_min[:, i:i+chunk_size])
+            row_arg[:, i:i+chunk_size] = torch.where(better, indices + j, row_arg[:, i:i+chunk_size])
+
+            values, indices = d.min(dim=1)
+            better = values < col_min[:, j:j+chunk_size]
+            col_min[:, j:j+chunk_size] = torch.where(better, values, col_min[:, j:j+chunk_size])
+            col_arg[:, j:j+chunk_size] = torch.where(better, indices + i, col_arg[:, j:j+chunk_size])
+
+    return row_arg, col_arg
+
+
+def chamfer_loss(x, y, x_mask=None, y_mask=None, max_memory=CHAMFER_MAX_MEMORY, chunk_size=None):
+    """
+    Chamfer distance computed in memory-bounded blocks.
+
+    The nearest neighbors are searched without building the full cdist matrix, then the matched distances are
+    recomputed with autograd, which gives the same gradients as min() over the full matrix.
+
+    Args:
+        x, y (torch.Tensor): (N, 2) and (M, 2), or batched (B, N, 2) and (B, M, 2).
+        x_mask, y_mask (torch.Tensor, optional): (B, N) / (B, M) valid points of padded batches.
+        max_memory (int): Memory ceiling in bytes of one distance block, used to pick the chunk size.
+        chunk_size (int, optional): Explicit block size (overrides max_memory).
+
+    Returns:
+        torch.Tensor: scalar, or (B,) per-sample losses for batched input.
+    """
+    unbatched = x.dim() == 2
+    if unbatched:
+        x, y = x[None], y[None]
+        x_mask = x_mask[None] if x_mask is not None else None
+        y_mask = y_mask[None] if y_mask is not None else None
+
+    if chunk_size is None:
+        # cdist needs about 3 block-sized buffers (output, masks and min reductions)
+        chunk_size = max(int((max_memory / (3 * x.size(0) * x.element_size())) ** 0.5), 1)
+
+    row_arg, col_arg = _nearest_neighbors(x.detach(), y.detach(), x_mask, y_mask, chunk_size=chunk_size)
+
+    d_x = (x - y.gather(1, row_arg.unsqueeze(-1).expand(-1, -1, y.size(-1)))).norm(dim=-1)
+    d_y = (y - x.gather(1, col_arg.unsqueeze(-1).expand(-1, -1, x.size(-1)))).norm(dim=-1)
+
+    if x_mask is not None:
+        d_x = (d_x * x_mask).sum(dim=1) / x_mask.sum(dim=1).clamp(min=1)
+    else:
+        d_x = d_x.mean(dim=1)
+    if y_mask is not None:
+        d_y = (d_y * y_mask).sum(dim=1) / y_mask.sum(dim=1).clamp(min=1)
+    else:
+        d_y = d_y.mean(dim=1)
+
+    loss = d_y + d_x
+    return loss[0] if unbatched else loss
 
 
 def continuity_loss(x):
@@ -18,6 +88,56 @@ def svg_length_loss(p_pred, p_target):
     return (target_length - pred_length).abs() / target_length
 
 
+def _shift_costs_exact(p_pred, p_target, lengths):
+    # costs[b, i] = mean_k |p_pred[b, k] - p_target[b, (k + i) % n_b]|, from one (B, n, n) distance matrix
+    B, n = p_pred.shape[:2]
+    d = torch.cdist(p_pred, p_target)
+    k = torch.arange(n, device=p_pred.device)
+    idx = (k[None, :, None] + k[None, None, :]) % lengths[:, None, None]  # (B, k, i)
+    valid = k[None] < lengths[:, None]
+    costs = (d.gather(2, idx) * valid[..., None]).sum(dim=1) / lengths[:, None]
+    return costs.masked_fill(~valid, float("inf"))
+
+
+def _shift_costs_fft(p_pred, p_target):
+    # squared distance proxy: sum_k |a_k - b_(k+i)|^2 = |a|^2 + |b|^2 - 2 * xcorr(a, b)[i], O(n log n)
+    n = p_pred.size(1)
+    xcorr = torch.fft.irfft(torch.fft.rfft(p_pred, dim=1).conj() * torch.fft.rfft(p_target, dim=1), n=n, dim=1).sum(dim=-1)
+    return (p_pred.pow(2).sum(dim=(1, 2))[:, None] + p_target.pow(2).sum(dim=(1, 2))[:, None] - 2 * xcorr) / n
+
+
+@torch.no_grad()
+def find_best_shift(p_pred, p_target, mask=None, method="exact"):
+    """
+    Cyclic shift i minimizing the mean distance between p_pred and reorder(p_target, i), for all pairs at once.
+
+    Args:
+        p_pred, p_target (torch.Tensor): (n, 2) or batched (B, n, 2) point lists of equal length.
+        mask (torch.Tensor, optional): (B, n) valid points; shifts are taken modulo each sample's length.
+        method (str): "exact" (distance matrix, O(n^2)) or "fft" (cross-correlation on squared distances,
+            O(n log n), for large n without mask).
+
+    Returns:
+        torch.Tensor: shift index, scalar or (B,).
+    """
+    unbatched = p_pred.dim() == 2
+    if unbatched:
+        p_pred, p_target = p_pred[None], p_target[None]
+        mask = mask[None] if mask is not None else None
+
+    B, n = p_pred.shape[:2]
+    if method == "fft" and mask is None:
+        costs = _shift_costs_fft(p_pred.float(), p_target.float())
+    elif method in ("exact", "fft"):
+        lengths = mask.sum(dim=-1).clamp(min=1) if mask is not None else torch.full((B,), n, device=p_pred.device)
+        costs = _shift_costs_exact(p_pred, p_target, lengths)
+    else:
+        raise ValueError(f"Unknown shift search method: {method}")
+
+    shifts = costs.argmin(dim=-1)
+    return shifts[0] if unbatched else shifts
+
+
 def svg_emd_loss(p_pred, p_target,
                  first_point_weight=False, return_matched_indices=False):
     n, m = len(p_pred), len(p_target)
@@ -28,15 +148,11 @@ def svg_emd_loss(p_pred, p_target,
     # Make target point lists clockwise
     p_target = make_clockwise(p_target)
 
-    # Compute length distribution
-    distr_pred =  torch.linspace(0., 1., n).to(p_pred.device)
-    distr_target = get_length_distribution(p_target, normalize=True)
-    d = torch.cdist(distr_pred.unsqueeze(-1), distr_target.unsqueeze(-1))
-    matching = d.argmin(dim=-1)
-    p_target_sub = p_target[matching]
+    # Resample target uniformly along its length
+    p_target_sub, matching = sample_uniform_points(p_target, n, return_indices=True)
 
     # EMD
-    i = np.argmin([torch.norm(p_pred - reorder(p_target_sub, i), dim=-1).mean() for i in range(n)])
+    i = int(find_best_shift(p_pred, p_target_sub))
 
     losses = torch.norm(p_pred - reorder(p_target_sub, i), dim=-1)
 
@@ -49,3 +165,115 @@ def svg_emd_loss(p_pred, p_target,
         return losses.mean(), (p_pred, p_target, reorder(matching, i))
 
     return losses.mean()
+
+
+######### Batched losses
+# Points are padded (B, N, 2) tensors, e.g. SVGTensorBatch.sample_points(); `valid` is either (B,) lengths or a
+# (B, N) boolean mask of valid (leading) points.
+
+def _as_mask(x, valid=None):
+    if valid is None:
+        return torch.ones(x.shape[:2], dtype=torch.bool, device=x.device)
+    if valid.dim() == 1:
+        return torch.arange(x.size(1), device=x.device)[None] < valid.to(x.device)[:, None]
+    return valid.to(x.device).bool()
+
+
+def _masked_mean(v, mask):
+    return (v * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+
+
+def batched_continuity_loss(x, valid=None):
+    mask = _as_mask(x, valid)
+    d = (x[:, 1:] - x[:, :-1]).norm(dim=-1, p=2)
+    return _masked_mean(d, mask[:, 1:] & mask[:, :-1])
+
+
+def batched_get_length(p, valid=None):
+    mask = _as_mask(p, valid)
+    d = (p[:, 1:] - p[:, :-1]).norm(dim=-1)
+    return (d * (mask[:, 1:] & mask[:, :-1])).sum(dim=1)
+
+
+def batched_svg_length_loss(p_pred, p_target, pred_valid=None, target_valid=None):
+    pred_length, target_length = batched_get_length(p_pred, pred_valid), batched_get_length(p_target, target_valid)
+    return (target_length - pred_length).abs() / target_length
+
+
+def batched_make_clockwise(p, valid=None):
+    # flips the valid part of every counter-clockwise polyline
+    mask = _as_mask(p, valid)
+    lengths = mask.sum(dim=1)
+    start, end = p[:, :-1], p[:, 1:]
+    det = start[..., 0] * end[..., 1] - start[..., 1] * end[..., 0]
+    clockwise = (det * (mask[:, 1:] & mask[:, :-1])).sum(dim=1) > 0
+
+    k = torch.arange(p.size(1), device=p.device)[None]
+    flipped = torch.where(k < lengths[:, None], lengths[:, None] - 1 - k, k)
+    idx = torch.where(clockwise[:, None], k.expand_as(flipped), flipped)
+    return p.gather(1, idx.unsqueeze(-1).expand_as(p))
+
+
+def batched_svg_emd_loss(p_pred, p_target, pred_valid=None, target_valid=None, first_point_weight=False):
+    pred_mask, target_mask = _as_mask(p_pred, pred_valid), _as_mask(p_target, target_valid)
+    pred_lengths, target_lengths = pred_mask.sum(dim=1), target_mask.sum(dim=1)
+    B, n = p_pred.shape[:2]
+
+    # Make target point lists clockwise, then resample them to the number of predicted points
+    p_target = batched_make_clockwise(p_target, target_mask)
+    p_target_sub = sample_uniform_points(p_target, n, lengths=target_lengths, out_lengths=pred_lengths)
+
+    # EMD over the best cyclic shift of every pair
+    shifts = find_best_shift(p_pred, p_target_sub, mask=pred_mask)
+    k = torch.arange(n, device=p_pred.device)[None]
+    idx = (k + shifts[:, None]) % pred_lengths.clamp(min=1)[:, None]
+    p_target_sub = p_target_sub.gather(1, idx.unsqueeze(-1).expand_as(p_target_sub))
+
+    losses = torch.norm(p_pred - p_target_sub, dim=-1)
+
+    if first_point_weight:
+        weights = torch.ones_like(losses)
+        weights[:, 0] = 10.
+        losses = losses * weights
+
+    return _masked_mean(losses, pred_mask)
+
+
+BATCHED_LOSSES = {
+    "chamfer": lambda p_pred, p_target, pred_mask, target_mask: chamfer_loss(p_pred, p_target, pred_mask, target_mask),
+    "continuity": lambda p_pred, p_target, pred_mask, target_mask: batched_continuity_loss(p_pred, pred_mask),
+    "length": batched_svg_length_loss,
+    "emd": batched_svg_emd_loss,
+}
+
+
+def svg_loss_suite(p_pred, p_target, pred_valid=None, target_valid=None, weights=None, reduction="mean"):
+    """
+    All geometric losses of a batch of path pairs in one call.
+
+    Args:
+        p_pred, p_target (torch.Tensor): (B, N, 2) and (B, M, 2) padded point sets.
+        pred_valid, target_valid (torch.Tensor, optional): (B,) lengths or (B, N) masks.
+        weights (dict, optional): loss name -> weight, over BATCHED_LOSSES (default: all with weight 1).
+        reduction (str): "mean" or "sum" over the batch for the total loss.
+
+    Returns:
+        dict: per-sample (B,) loss of every weighted term, and "loss", the reduced weighted sum.
+    """
+    if weights is None:
+        weights = {name: 1. for name in BATCHED_LOSSES}
+    pred_mask, target_mask = _as_mask(p_pred, pred_valid), _as_mask(p_target, target_valid)
+
+    res = {}
+    total = p_pred.new_zeros(p_pred.size(0))
+    for name, weight in weights.items():
+        res[name] = BATCHED_LOSSES[name](p_pred, p_target, pred_mask, target_mask)
+        total = total + weight * res[name]
+
+    if reduction == "mean":
+        res["loss"] = total.mean()
+    elif reduction == "sum":
+        res["loss"] = total.sum()
+    else:
+        raise ValueError(f"Unknown reduction: {reduction}")
+    return res
@@ -0,0 +1,140 @@
+from __future__ import annotations
+import torch
+from typing import List, Sequence, Tuple, Union
+from .tensor import SVGTensor, SVGTensorBatch
+
+# NOTE: 短いシーケンスを固定長の行に詰め込む（パディングをほぼ無くす）。
+# 各行の segment_ids でサンプル境界を、positions で各サンプル内の位置（境界で0に戻る）を表す。
+
+
+def _get_matrix(sample: Union[SVGTensor, torch.Tensor]):
+    if isinstance(sample, SVGTensor):
+        return sample.matrix[:int(sample.seq_len)]
+    return sample
+
+
+def plan_packing(lengths: Sequence[int], row_len: int) -> List[List[int]]:
+    """First-fit decreasing assignment of sequences to rows of `row_len`.
+
+    Returns:
+        list of sample index lists, one per row.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: -lengths[i])
+    rows, free = [], []
+    for i in order:
+        if lengths[i] > row_len:
+            raise ValueError(f"Sequence {i} of length {lengths[i]} does not fit in a row of length {row_len}.")
+        for r, space in enumerate(free):
+            if lengths[i] <= space:
+                rows[r].append(i)
+                free[r] -= lengths[i]
+                break
+        else:
+            rows.append([i])
+            free.append(row_len - lengths[i])
+    return rows
+
+
+def pack_sequences(samples: List[Union[SVGTensor, torch.Tensor]], row_len: int, rows: List[List[int]] = None,
+                   add_sos=False, add_eos=False, PAD_VAL=-1, ARGS_DIM=256) -> Tuple[SVGTensorBatch, List[List[int]]]:
+    """Pack several sequences per row of a (B, row_len, 19) SVGTensorBatch.
+
+    Args:
+        samples: SVGTensor or (L, 19) matrices without EOS/padding rows.
+        row_len: length of every packed row.
+        rows: optional packing plan (see plan_packing), computed if None.
+        add_sos, add_eos: add SOS/EOS rows around every sequence (counted in its segment).
+
+    Returns:
+        batch: packed SVGTensorBatch with segment_ids and positions. seq_len is the number of used rows.
+        rows: sample indices of every row, in segment order.
+    """
+    matrices = [_get_matrix(sample).float() for sample in samples]
+    extra = int(add_sos) + int(add_eos)
+    lengths = [m.size(0) + extra for m in matrices]
+    if rows is None:
+        rows = plan_packing(lengths, row_len)
+
+    B, D = len(rows), matrices[0].size(-1) if matrices else 19
+    data = torch.full((B, row_len, D), float(PAD_VAL))
+    data[..., SVGTensor.Index.ELEMENT] = SVGTensor.ELEMENTS.index("EOS")
+    segment_ids = torch.full((B, row_len), -1, dtype=torch.long)
+    positions = torch.zeros((B, row_len), dtype=torch.long)
+    seq_len = torch.tensor([sum(lengths[i] for i in row) for row in rows], dtype=torch.long)
+
+    # row and offset of every segment
+    sample_ids = [i for row in rows for i in row]
+    row_ids = [r for r, row in enumerate(rows) for _ in row]
+    seg_ids = [s for row in rows for s in range(len(row))]
+    offsets = [sum(lengths[j] for j in row[:s]) for row in rows for s in range(len(row))]
+    if not sample_ids:
+        return SVGTensorBatch(data, seq_len, PAD_VAL=PAD_VAL, ARGS_DIM=ARGS_DIM, segment_ids=segment_ids, positions=positions), rows
+
+    seg_lengths = torch.tensor([lengths[i] for i in sample_ids])
+    seg_rows = torch.tensor(row_ids).repeat_interleave(seg_lengths)
+    seg_starts = torch.tensor(offsets).repeat_interleave(seg_lengths)
+    seg_positions = torch.arange(int(seg_lengths.sum())) - (seg_lengths.cumsum(0) - seg_lengths).repeat_interleave(seg_lengths)
+    segment_ids[seg_rows, seg_starts + seg_positions] = torch.tensor(seg_ids).repeat_interleave(seg_lengths)
+    positions[seg_rows, seg_starts + seg_positions] = seg_positions
+
+    # sequence rows (EOS rows are already in place since they equal padding rows)
+    flat = torch.cat([matrices[i] for i in sample_ids])
+    flat_lengths = seg_lengths - extra
+    flat_rows = torch.tensor(row_ids).repeat_interleave(flat_lengths)
+    flat_cols = (torch.tensor(offsets) + int(add_sos)).repeat_interleave(flat_lengths) \
+        + torch.arange(flat.size(0)) - (flat_lengths.cumsum(0) - flat_lengths).repeat_interleave(flat_lengths)
+    data[flat_rows, flat_cols] = flat
+
+    if add_sos:
+        sos_rows, sos_cols = torch.tensor(row_ids), torch.tensor(offsets)
+        data[sos_rows, sos_cols] = PAD_VAL
+        data[sos_rows, sos_cols, SVGTensor.Index.ELEMENT] = SVGTensor.ELEMENTS.index("SOS")
+
+    packed = SVGTensorBatch(data, seq_len, PAD_VAL=PAD_VAL, ARGS_DIM=ARGS_DIM, segment_ids=segment_ids, positions=positions)
+    return packed, rows
+
+
+def unpack_sequences(batch: SVGTensorBatch, rows: List[List[int]] = None) -> List[SVGTensor]:
+    """Split a packed batch back into one SVGTensor per segment (in sample order if `rows` is given)."""
+    svg_tensors, sample_ids = [], []
+    for r in range(len(batch)):
+        segment_ids = batch.segment_ids[r]
+        nb_segments = int(segment_ids.max()) + 1 if segment_ids.numel() else 0
+        for s in range(nb_segments):
+            matrix = batch.data[r, segment_ids == s]
+            svg_tensors.append(SVGTensor.from_data(matrix, PAD_VAL=batch.PAD_VAL, ARGS_DIM=batch.ARGS_DIM))
+            if rows is not None:
+                sample_ids.append(rows[r][s])
+
+    if rows is not None:
+        svg_tensors = [t for _, t in sorted(zip(sample_ids, svg_tensors), key=lambda x: x[0])]
+    return svg_tensors
+
+
+def segment_attention_mask(segment_ids: torch.Tensor):
+    """(B, L, L) boolean mask, True where query and key rows belong to the same (non padding) segment."""
+    same = segment_ids.unsqueeze(-1) == segment_ids.unsqueeze(-2)
+    return same & (segment_ids >= 0).unsqueeze(-1)
+
+
+def packing_stats(batch: SVGTensorBatch):
+    real_tokens = int(batch.mask.sum())
+    padded_tokens = batch.data.size(0) * batch.data.size(1)
+    return {
+        "num_rows": batch.data.size(0),
+        "num_segments": int((batch.positions == 0).logical_and(batch.mask).sum()),
+        "real_tokens": real_tokens,
+        "padded_tokens": padded_tokens,
+        "efficiency": real_tokens / padded_tokens if padded_tokens else 1.,
+    }
+
+
+class PackCollate:
+    """collate_fn packing every DataLoader batch into rows of `row_len`. Returns (packed batch, packing plan)."""
+    def __init__(self, row_len: int, add_sos=False, add_eos=False):
+        self.row_len = row_len
+        self.add_sos = add_sos
+        self.add_eos = add_eos
+
+    def __call__(self, samples):
+        return pack_sequences(samples, self.row_len, add_sos=self.add_sos, add_eos=self.add_eos)
@@ -0,0 +1,155 @@
+from __future__ import annotations
+import math
+import torch
+import torch.utils.data
+from typing import Iterator, List, Sequence
+from .tensor import SVGTensor, SVGTensorBatch
+
+# NOTE: 長さの近いサンプルを同じバッチに集め、バッチ内最大長までのみパディングする（固定長 pad(seq_len=51) の代わり）
+
+
+def get_lengths(dataset) -> List[int]:
+    """seq_len of every sample in a dataset of SVGTensor (or (L, 19) tensors)."""
+    lengths = []
+    for sample in dataset:
+        if isinstance(sample, SVGTensor):
+            lengths.append(int(sample.seq_len))
+        else:
+            lengths.append(int(sample.size(0)))
+    return lengths
+
+
+def round_up(n, multiple_of=8):
+    return -(-n // multiple_of) * multiple_of if multiple_of else n
+
+
+def padding_stats(lengths: Sequence[int], batches: List[List[int]], multiple_of=8, fixed_len=None):
+    """Padding efficiency of a list of batches.
+
+    Args:
+        lengths: seq_len of every sample.
+        batches: list of sample index lists.
+        multiple_of: batch lengths are rounded up to this multiple.
+        fixed_len: if given, also report the efficiency of padding every sample to this length.
+
+    Returns:
+        dict: real/padded token counts and efficiency (real / padded).
+    """
+    real_tokens = 0
+    padded_tokens = 0
+    for batch in batches:
+        batch_lengths = [lengths[i] for i in batch]
+        real_tokens += sum(batch_lengths)
+        padded_tokens += len(batch) * round_up(max(batch_lengths), multiple_of)
+
+    stats = {
+        "num_batches": len(batches),
+        "real_tokens": real_tokens,
+        "padded_tokens": padded_tokens,
+        "efficiency": real_tokens / padded_tokens if padded_tokens else 1.,
+    }
+
+    if fixed_len is not None:
+        nb_samples = sum(len(batch) for batch in batches)
+        fixed_tokens = nb_samples * max(fixed_len, max(lengths) if lengths else 0)
+        stats["fixed_padded_tokens"] = fixed_tokens
+        stats["fixed_efficiency"] = real_tokens / fixed_tokens if fixed_tokens else 1.
+
+    return stats
+
+
+class BucketBatchSampler(torch.utils.data.Sampler):
+    """Batch sampler grouping samples of similar seq_len.
+
+    Indices are shuffled, split into pools of `batch_size * pool_batches` samples, sorted by length inside each pool
+    and cut into batches; batch order is shuffled again. Use with DataLoader(batch_sampler=...) and PadCollate.
+    """
+    def __init__(self, lengths: Sequence[int], batch_size: int, pool_batches=50, shuffle=True, drop_last=False, seed=0):
+        self.lengths = list(lengths)
+        self.batch_size = batch_size
+        self.pool_batches = pool_batches
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.seed = seed
+        self.epoch = 0
+
+    @staticmethod
+    def from_dataset(dataset, *args, **kwargs):
+        return BucketBatchSampler(get_lengths(dataset), *args, **kwargs)
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def _batches(self) -> List[List[int]]:
+        lengths = torch.tensor(self.lengths, dtype=torch.long)
+        g = torch.Generator()
+        g.manual_seed(self.seed + self.epoch)
+
+        indices = torch.randperm(len(lengths), generator=g) if self.shuffle else torch.arange(len(lengths))
+        pool_size = self.batch_size * self.pool_batches if self.pool_batches else len(lengths)
+
+        batches = []
+        for pool in indices.split(max(pool_size, 1)):
+            pool = pool[torch.argsort(lengths[pool], stable=True)]
+            for batch in pool.split(self.batch_size):
+                if len(batch) < self.batch_size and self.drop_last:
+                    continue
+                batches.append(batch.tolist())
+
+        if self.shuffle:
+            order = torch.randperm(len(batches), generator=g).tolist()
+            batches = [batches[i] for i in order]
+        return batches
+
+    def __iter__(self) -> Iterator[List[int]]:
+        return iter(self._batches())
+
+    def __len__(self):
+        pool_size = max(self.batch_size * self.pool_batches if self.pool_batches else len(self.lengths), 1)
+        full_pools, rest = divmod(len(self.lengths), pool_size)
+        nb_batches = (lambda n: n // self.batch_size) if self.drop_last else (lambda n: math.ceil(n / self.batch_size))
+        return full_pools * nb_batches(pool_size) + nb_batches(rest)
+
+    def padding_stats(self, multiple_of=8, fixed_len=None):
+        return padding_stats(self.lengths, self._batches(), multiple_of=multiple_of, fixed_len=fixed_len)
+
+
+class PadCollate:
+    """collate_fn padding each batch to its own max length, rounded up to `multiple_of`.
+
+    Keeps running padding statistics of the batches it produced (see `stats`).
+    """
+    def __init__(self, multiple_of=8, add_sos=False, add_eos=False):
+        self.multiple_of = multiple_of
+        self.add_sos = add_sos
+        self.add_eos = add_eos
+
+        self.real_tokens = 0
+        self.padded_tokens = 0
+        self.num_batches = 0
+
+    def __call__(self, samples) -> SVGTensorBatch:
+        batch = SVGTensorBatch.collate_fn(samples)
+        if self.add_sos:
+            batch.add_sos()
+        if self.add_eos:
+            batch.add_eos()
+        batch.pad(multiple_of=self.multiple_of)
+
+        self.real_tokens += int(batch.seq_len.sum())
+        self.padded_tokens += batch.data.size(0) * batch.data.size(1)
+        self.num_batches += 1
+        return batch
+
+    @property
+    def stats(self):
+        # NOTE: DataLoaderのworkerごとにコピーされるので、num_workers > 0 の場合はメインプロセスでは集計されない
+        return {
+            "num_batches": self.num_batches,
+            "real_tokens": self.real_tokens,
+            "padded_tokens": self.padded_tokens,
+            "efficiency": self.real_tokens / self.padded_tokens if self.padded_tokens else 1.,
+        }
+
+    def reset_stats(self):
+        self.real_tokens = self.padded_tokens = self.num_batches = 0
@@ -0,0 +1,151 @@
+from __future__ import annotations
+import math
+import torch
+from .tensor import SVGTensor
+
+# NOTE: SVGTensor / SVGTensorBatch の sample_points から呼ばれるサンプリングカーネル。
+# 基底行列は (n, device, dtype) ごとにキャッシュする。l, c, q はべき基底の行列積、a は中心パラメータ化で評価する。
+
+SAMPLED_COMMANDS = ["l", "c", "q", "a"]
+
+_BASIS_CACHE = {}
+
+
+def get_sample_basis(n, device=None, dtype=torch.float32):
+    """Cached Bezier sampling basis.
+
+    Returns:
+        Z: (n, 4) power basis [1, z, z^2, z^3] evaluated on linspace(0, 1, n).
+        Q: (len(PATH_COMMANDS), 4, 4) coefficient matrices over [start_pos, control1, control2, end_pos].
+    """
+    device = torch.device(device) if device is not None else torch.device("cpu")
+    key = (n, device, dtype)
+    if key not in _BASIS_CACHE:
+        z = torch.linspace(0, 1, n, device=device, dtype=dtype)
+        Z = torch.stack([torch.ones_like(z), z, z.pow(2), z.pow(3)], dim=1)
+
+        Q = torch.zeros(len(SVGTensor.PATH_COMMANDS), 4, 4, device=device, dtype=dtype)
+        Q[SVGTensor.PATH_COMMANDS.index("l")] = torch.tensor([[1., 0., 0., 0.],
+                                                              [-1, 0., 0., 1.],
+                                                              [0., 0., 0., 0.],
+                                                              [0., 0., 0., 0.]])
+        Q[SVGTensor.PATH_COMMANDS.index("c")] = torch.tensor([[1., 0., 0., 0.],
+                                                              [-3, 3., 0., 0.],
+                                                              [3., -6, 3., 0.],
+                                                              [-1, 3., -3, 1.]])
+        Q[SVGTensor.PATH_COMMANDS.index("q")] = torch.tensor([[1., 0., 0., 0.],  # control point in control1
+                                                              [-2, 2., 0., 0.],
+                                                              [1., -2, 0., 1.],
+                                                              [0., 0., 0., 0.]])
+        # "m", "a" (see _sample_arcs) and "z" have no Bezier basis
+
+        _BASIS_CACHE[key] = (Z, Q)
+    return _BASIS_CACHE[key]
+
+
+def _sample_arcs(rows, z):
+    """Points of elliptic arcs, (K, n, 2). rows: (K, 19) arc rows, z: (n,) curve parameters.
+
+    Reference: https://www.w3.org/TR/SVG2/implnote.html#ArcConversionEndpointToCenter
+    """
+    Index = SVGTensor.Index
+    p1, p2 = rows[:, Index.START_POS], rows[:, Index.END_POS]
+    r = rows[:, Index.RADIUS].abs()
+    phi = torch.deg2rad(rows[:, Index.X_AXIS_ROT])
+    large_arc, sweep = rows[:, Index.LARGE_ARC_FLG] > 0.5, rows[:, Index.SWEEP_FLG] > 0.5
+    cos, sin = phi.cos(), phi.sin()
+
+    h = (p1 - p2) / 2
+    x1p, y1p = cos * h[:, 0] + sin * h[:, 1], -sin * h[:, 0] + cos * h[:, 1]
+
+    # degenerate arcs (zero radius or identical end points) are drawn as lines
+    degenerate = (r.min(dim=-1).values < 1e-9) | ((x1p.abs() < 1e-9) & (y1p.abs() < 1e-9))
+    r = torch.where(degenerate.unsqueeze(-1), torch.ones_like(r), r)
+
+    # scale up radii that are too small to join both end points
+    lmbda = (x1p / r[:, 0]).pow(2) + (y1p / r[:, 1]).pow(2)
+    r = r * lmbda.clamp(min=1.).sqrt().unsqueeze(-1)
+    rx, ry = r[:, 0], r[:, 1]
+
+    num = (rx * ry).pow(2) - (rx * y1p).pow(2) - (ry * x1p).pow(2)
+    den = ((rx * y1p).pow(2) + (ry * x1p).pow(2)).clamp(min=1e-12)
+    coef = (num / den).clamp(min=1e-12).sqrt() * torch.where(large_arc == sweep, -1., 1.).to(rows.dtype)
+    cxp, cyp = coef * rx * y1p / ry, -coef * ry * x1p / rx
+    m = (p1 + p2) / 2
+    cx, cy = cos * cxp - sin * cyp + m[:, 0], sin * cxp + cos * cyp + m[:, 1]
+
+    ux, uy = (x1p - cxp) / rx, (y1p - cyp) / ry
+    vx, vy = (-x1p - cxp) / rx, (-y1p - cyp) / ry
+    theta_1 = torch.atan2(uy, ux)
+    delta_theta = torch.atan2(ux * vy - uy * vx, ux * vx + uy * vy)
+    delta_theta = torch.where(~sweep & (delta_theta > 0), delta_theta - 2 * math.pi, delta_theta)
+    delta_theta = torch.where(sweep & (delta_theta < 0), delta_theta + 2 * math.pi, delta_theta)
+
+    theta = theta_1[:, None] + z[None] * delta_theta[:, None]
+    ex, ey = rx[:, None] * theta.cos(), ry[:, None] * theta.sin()
+    points = torch.stack([cos[:, None] * ex - sin[:, None] * ey + cx[:, None],
+                          sin[:, None] * ex + cos[:, None] * ey + cy[:, None]], dim=-1)
+
+    lines = p1[:, None] + z[None, :, None] * (p2 - p1)[:, None]
+    return torch.where(degenerate[:, None, None], lines, points)
+
+
+def sample_points(data, n=10, mask=None, padded=True):
+    """Sample n points on every drawing command (l, c, q, a) of one or a batch of S_(i,j) matrices.
+
+    Consecutive commands share their end/start point, so the last point of every command but the last is dropped
+    (same convention as before).
+
+    Args:
+        data (torch.Tensor): (L, 19) or (B, L, 19) rows in the SVGTensor.matrix layout.
+        n (int): Points per command.
+        mask (torch.Tensor, optional): (B, L) valid rows.
+        padded (bool): Return zero-padded (B, P, 2) points and (B,) lengths; otherwise a list of (P_b, 2) tensors.
+
+    Returns:
+        (P, 2) points for unbatched input, else (points, lengths) or a list of point tensors.
+    """
+    unbatched = data.dim() == 2
+    if unbatched:
+        data = data[None]
+        mask = mask[None] if mask is not None else None
+
+    Index = SVGTensor.Index
+    B, L = data.shape[:2]
+    Z, Q = get_sample_basis(n, data.device, data.dtype)
+
+    commands = data[..., Index.COMMAND].long()
+    sampled = torch.tensor([SVGTensor.PATH_COMMANDS.index(c) for c in SAMPLED_COMMANDS], device=data.device)
+    keep = torch.isin(commands, sampled)
+    if mask is not None:
+        keep = keep & mask
+
+    # move sampled commands to the front of each row, preserving their order
+    order = torch.argsort((~keep).to(torch.int8), dim=1, stable=True)
+    rows = data.gather(1, order.unsqueeze(-1).expand_as(data))
+    commands = commands.gather(1, order).clamp(min=0)
+    nb_commands = keep.sum(dim=1)
+
+    pos = rows[..., Index.START_POS.start:Index.END_POS.stop].reshape(B, L, 4, 2)
+    sample_points = torch.matmul(Z, torch.matmul(Q[commands], pos))  # (B, L, n, 2)
+
+    is_arc = (commands == SVGTensor.PATH_COMMANDS.index("a")) & (torch.arange(L, device=data.device)[None] < nb_commands[:, None])
+    if is_arc.any():
+        sample_points = sample_points.index_put((is_arc,), _sample_arcs(rows[is_arc], Z[:, 1]))
+
+    # Last point being first point of next command, we drop last point except the one from the last command
+    batch_idx = torch.arange(B, device=data.device)
+    last_point = sample_points[batch_idx, (nb_commands - 1).clamp(min=0), -1]
+    points = torch.cat([sample_points[:, :, :-1].reshape(B, L * (n - 1), 2), last_point.new_zeros(B, 1, 2)], dim=1)
+    points = points.index_put((batch_idx, nb_commands * (n - 1)), last_point)
+
+    lengths = nb_commands * (n - 1) + (nb_commands > 0).long()
+    valid = torch.arange(points.size(1), device=data.device)[None] < lengths[:, None]
+
+    if unbatched:
+        return points[0, :int(lengths[0])]
+    if not padded:
+        return list(points[valid].split(lengths.tolist()))
+
+    points = points * valid.unsqueeze(-1)
+    return points[:, :int(lengths.max()) if B else 0], lengths
@@ -1,8 +1,8 @@
 from __future__ import annotations
 import torch
 import torch.utils.data
-from .utils import positional_encoding
-from typing import Union
+from .utils import positional_encoding, sample_uniform_points
+from typing import List, Union
 Num = Union[int, float]
 
 # NOTE: パディングの値が-1の場合、SOS追加によって、SOSの次トークンの初期位置が-1になる。
@@ -191,7 +191,7 @@ class SVGTensor:
 
     def add_eos(self):
         self.elements = torch.cat([self.elements, self.eos_token])
-        self.commands = torch.cat([self.commands.new_full((1, 1), self.PAD_VAL), self.commands])
+        self.commands = torch.cat([self.commands, self.commands.new_full((1, 1), self.PAD_VAL)])
 
         for key in self.arg_keys:
             v = self.__getattribute__(key)
@@ -263,69 +263,263 @@ class SVGTensor:
         return data
 
     def sample_points(self, n=10):
-        device = self.commands.device
+        from .sampling import sample_points
+        return sample_points(self.matrix, n=n)
 
-        z = torch.linspace(0, 1, n, device=device)
-        Z = torch.stack([torch.ones_like(z), z, z.pow(2), z.pow(3)], dim=1)
+    @staticmethod
+    def get_length_distribution(p, normalize=True):
+        start, end = p[:-1], p[1:]
+        length_distr = torch.norm(end - start, dim=-1).cumsum(dim=0)
+        length_distr = torch.cat([length_distr.new_zeros(1), length_distr])
+        if normalize:
+            length_distr = length_distr / length_distr[-1]
+        return length_distr
+
+    def sample_uniform_points(self, n=100):
+        p = self.sample_points(n=n)
+        return sample_uniform_points(p, n)
+
+    @staticmethod
+    def embed_matrix(matrix, positions=None):
+        # matrix: (L, D) or batched (B, L, D); positions: optional (L,) or (B, L) position of every row
+        Dm = matrix.size(-2)
+        dim = matrix.size(-1)
+        pe = positional_encoding(Dm, dim, positions=positions, dtype=matrix.dtype, device=matrix.device)
+        return matrix + pe
+
+    def embed(self, positions=None):
+        # positions: optional (L,) position of every row, e.g. restarting at segment boundaries
+        return self.embed_matrix(self.matrix, positions=positions)
 
-        Q = torch.tensor([
-            [[0., 0., 0., 0.],  #  "m"
-             [0., 0., 0., 0.],
-             [0., 0., 0., 0.],
-             [0., 0., 0., 0.]],
 
-            [[1., 0., 0., 0.],  # "l"
-             [-1, 0., 0., 1.],
-             [0., 0., 0., 0.],
-             [0., 0., 0., 0.]],
 
-            [[1., 0., 0., 0.],  #  "c"
-             [-3, 3., 0., 0.],
-             [3., -6, 3., 0.],
-             [-1, 3., -3, 1.]],
+class SVGTensorBatch:
+    """Batch-first container of padded S_(i,j) matrices.
 
-            torch.zeros(4, 4),  # "a", no support yet
+    Stores one (B, L, 19) tensor in the SVGTensor.matrix layout and the number of valid rows per sample.
+    Rows past seq_len are padding rows (EOS element, PAD_VAL everywhere else).
+    NOTE: seq_len counts SOS but not EOS, same as SVGTensor.
 
-            torch.zeros(4, 4),  # "EOS"
-            torch.zeros(4, 4),  # "SOS"
-            torch.zeros(4, 4),  # "z"
-        ], device=device)
+    Packed batches (see difflib.packing) hold several sequences per row: segment_ids (B, L) gives the segment of
+    every row (-1 on padding) and positions (B, L) restarts from 0 at every segment.
+    """
 
-        commands, pos = self.commands.reshape(-1).long(), self.get_data(self.all_position_keys).reshape(-1, 4, 2)
-        inds = (commands == self.PATH_COMMANDS.index("l")) | (commands == self.PATH_COMMANDS.index("c"))
-        commands, pos = commands[inds], pos[inds]
+    Index = SVGTensor.Index
+    IndexArgs = SVGTensor.IndexArgs
 
-        Z_coeffs = torch.matmul(Q[commands], pos)
+    def __init__(self, data: torch.Tensor, seq_len: torch.Tensor = None, labels=None, PAD_VAL=-1, ARGS_DIM=256,
+                 segment_ids: torch.Tensor = None, positions: torch.Tensor = None):
+        # data: (B, L, 19), seq_len: (B,)
+        self.data = data.float()
+        B, L = self.data.shape[:2]
+        self.seq_len = torch.full((B,), L, dtype=torch.long) if seq_len is None else seq_len.long()
+        self.labels = labels
 
-        # Last point being first point of next command, we drop last point except the one from the last command
-        sample_points = torch.matmul(Z, Z_coeffs)
-        sample_points = torch.cat([sample_points[:, :-1].reshape(-1, 2), sample_points[-1, -1].unsqueeze(0)])
+        self.segment_ids = segment_ids
+        self._positions = positions
 
-        return sample_points
+        self.PAD_VAL = PAD_VAL
+        self.ARGS_DIM = ARGS_DIM
 
     @staticmethod
-    def get_length_distribution(p, normalize=True):
-        start, end = p[:-1], p[1:]
-        length_distr = torch.norm(end - start, dim=-1).cumsum(dim=0)
-        length_distr = torch.cat([length_distr.new_zeros(1), length_distr])
-        if normalize:
-            length_distr = length_distr / length_distr[-1]
-        return length_distr
+    def from_svg_tensors(svg_tensors: List[SVGTensor], labels=None, PAD_VAL=-1, ARGS_DIM=256):
+        rows = [t.matrix[:int(t.seq_len)] for t in svg_tensors]
+        if labels is None and any(t.label is not None for t in svg_tensors):
+            labels = [t.label for t in svg_tensors]
+        return SVGTensorBatch.from_tensors(rows, labels=labels, PAD_VAL=PAD_VAL, ARGS_DIM=ARGS_DIM)
 
-    def sample_uniform_points(self, n=100):
-        p = self.sample_points(n=n)
+    @staticmethod
+    def from_tensors(tensors: List[torch.Tensor], labels=None, PAD_VAL=-1, ARGS_DIM=256):
+        # tensors: list of (L_i, 19) matrices without EOS/padding rows
+        seq_len = torch.tensor([t.size(0) for t in tensors], dtype=torch.long)
+        data = torch.nn.utils.rnn.pad_sequence([t.float() for t in tensors], batch_first=True, padding_value=PAD_VAL)
+        batch = SVGTensorBatch(data, seq_len, labels=labels, PAD_VAL=PAD_VAL, ARGS_DIM=ARGS_DIM)
+        batch.data[~batch.mask, SVGTensor.Index.ELEMENT] = SVGTensor.ELEMENTS.index("EOS")
+        return batch
 
-        distr_unif = torch.linspace(0., 1., n).to(p.device)
-        distr = self.get_length_distribution(p, normalize=True)
-        d = torch.cdist(distr_unif.unsqueeze(-1), distr.unsqueeze(-1))
-        matching = d.argmin(dim=-1)
+    @staticmethod
+    def collate_fn(samples):
+        """collate_fn for torch.utils.data.DataLoader. Accepts SVGTensor or (L, 19) tensors."""
+        if isinstance(samples[0], SVGTensor):
+            return SVGTensorBatch.from_svg_tensors(samples, PAD_VAL=samples[0].PAD_VAL, ARGS_DIM=samples[0].ARGS_DIM)
+        return SVGTensorBatch.from_tensors(samples)
 
-        return p[matching]
+    def to_svg_tensors(self):
+        return [self[i] for i in range(len(self))]
 
-    def embed(self, ):
-        matrix = self.matrix
-        Dm = matrix.size(0)
-        dim = matrix.size(1)
-        pe = positional_encoding(Dm, dim)
-        return matrix + pe
+    def __len__(self):
+        return self.data.size(0)
+
+    def __getitem__(self, idx):
+        n = int(self.seq_len[idx])
+        label = self.labels[idx] if self.labels is not None else None
+        return SVGTensor.from_data(self.data[idx, :n], seq_len=self.seq_len[idx].clone(), label=label,
+                                   PAD_VAL=self.PAD_VAL, ARGS_DIM=self.ARGS_DIM)
+
+    @property
+    def is_packed(self):
+        return self.segment_ids is not None
+
+    def copy(self):
+        segment_ids = self.segment_ids.clone() if self.is_packed else None
+        positions = self._positions.clone() if self._positions is not None else None
+        return SVGTensorBatch(self.data.clone(), self.seq_len.clone(), labels=self.labels, PAD_VAL=self.PAD_VAL, ARGS_DIM=self.ARGS_DIM,
+                              segment_ids=segment_ids, positions=positions)
+
+    def to(self, *args, **kwargs):
+        self.data = self.data.to(*args, **kwargs)
+        self.seq_len = self.seq_len.to(self.data.device)
+        if self.is_packed:
+            self.segment_ids = self.segment_ids.to(self.data.device)
+        if self._positions is not None:
+            self._positions = self._positions.to(self.data.device)
+        return self
+
+    def pin_memory(self):
+        # called by DataLoader(pin_memory=True) on custom batch types
+        self.data = self.data.pin_memory()
+        self.seq_len = self.seq_len.pin_memory()
+        if self.is_packed:
+            self.segment_ids = self.segment_ids.pin_memory()
+        if self._positions is not None:
+            self._positions = self._positions.pin_memory()
+        return self
+
+    @property
+    def max_len(self):
+        return self.data.size(1)
+
+    @property
+    def mask(self):
+        # (B, L) True on valid rows
+        if self.is_packed:
+            return self.segment_ids >= 0
+        positions = torch.arange(self.max_len, device=self.data.device)
+        return positions[None] < self.seq_len.to(self.data.device)[:, None]
+
+    @property
+    def positions(self):
+        # (B, L) position of every row inside its own sequence
+        if self._positions is not None:
+            return self._positions
+        return torch.arange(self.max_len, device=self.data.device).expand(len(self), -1)
+
+    def _new_pad_rows(self, n):
+        rows = self.data.new_full((len(self), n, self.data.size(-1)), self.PAD_VAL)
+        rows[..., SVGTensor.Index.ELEMENT] = SVGTensor.ELEMENTS.index("EOS")
+        return rows
+
+    def add_sos(self):
+        assert not self.is_packed, "add SOS per segment when packing (pack_sequences(add_sos=True))"
+        sos = self.data.new_full((len(self), 1, self.data.size(-1)), self.PAD_VAL)
+        sos[..., SVGTensor.Index.ELEMENT] = SVGTensor.ELEMENTS.index("SOS")
+        self.data = torch.cat([sos, self.data], dim=1)
+        self.seq_len = self.seq_len + 1
+        return self
+
+    def drop_sos(self):
+        assert not self.is_packed, "drop_sos is not supported on packed batches"
+        self.data = self.data[:, 1:]
+        self.seq_len = self.seq_len - 1
+        return self
+
+    def add_eos(self):
+        assert not self.is_packed, "add EOS per segment when packing (pack_sequences(add_eos=True))"
+        if int(self.seq_len.max()) >= self.max_len:
+            self.data = torch.cat([self.data, self._new_pad_rows(1)], dim=1)
+
+        batch_idx = torch.arange(len(self), device=self.data.device)
+        self.data[batch_idx, self.seq_len.to(self.data.device)] = self._new_pad_rows(1)[:, 0]
+        return self
+
+    def pad(self, seq_len=None, multiple_of=None):
+        """Pad to max(seq_len, current length), rounded up to a multiple of `multiple_of`. Never truncates."""
+        target = max(seq_len or 0, self.max_len)
+        if multiple_of:
+            target = -(-target // multiple_of) * multiple_of
+
+        pad_len = target - self.max_len
+        if pad_len > 0:
+            self.data = torch.cat([self.data, self._new_pad_rows(pad_len)], dim=1)
+            if self.is_packed:
+                self.segment_ids = torch.cat([self.segment_ids, self.segment_ids.new_full((len(self), pad_len), -1)], dim=1)
+            if self._positions is not None:
+                self._positions = torch.cat([self._positions, self._positions.new_zeros((len(self), pad_len))], dim=1)
+        return self
+
+    def unpad(self):
+        # Remove EOS + padding past the longest sample
+        max_len = int(self.seq_len.max())
+        self.data = self.data[:, :max_len]
+        if self.is_packed:
+            self.segment_ids = self.segment_ids[:, :max_len]
+        if self._positions is not None:
+            self._positions = self._positions[:, :max_len]
+        return self
+
+    def elems(self):
+        return self.data[..., SVGTensor.Index.ELEMENT]
+
+    def cmds(self):
+        return self.data[..., SVGTensor.Index.COMMAND]
+
+    def args(self, with_start_pos=False):
+        if with_start_pos:
+            return self.data[..., SVGTensor.Index.RADIUS.start:SVGTensor.Index.END_POS.stop]
+
+        return torch.cat([self.data[..., SVGTensor.Index.RADIUS.start:SVGTensor.Index.SWEEP_FLG + 1],
+                          self.data[..., SVGTensor.Index.CONTROL1.start:SVGTensor.Index.END_POS.stop]], dim=-1)
+
+    def _get_real_commands_mask(self):
+        elem_mask = self.elems() < SVGTensor.ELEMENTS.index("EOS")
+        cmd_mask = self.cmds() < len(SVGTensor.PATH_COMMANDS)
+        return elem_mask & cmd_mask & self.mask
+
+    def _get_args_mask(self):
+        return SVGTensor.CMD_ARGS_MASK.to(self.data.device)[self.cmds().long()].bool()
+
+    def get_relative_args(self):
+        """Batched SVGTensor.get_relative_args: (B, L, 11)."""
+        data = self.args().clone()
+        B, L = data.shape[:2]
+
+        real_commands = self._get_real_commands_mask()
+
+        # index of the previous real command of every row (-1 if none)
+        positions = torch.arange(L, device=data.device).expand(B, L)
+        last_real = torch.where(real_commands, positions, torch.full_like(positions, -1)).cummax(dim=1).values
+        prev_real = torch.cat([last_real.new_full((B, 1), -1), last_real[:, :-1]], dim=1)
+        has_prev = real_commands & (prev_real >= 0)
+        if self.is_packed:
+            # never take the start position from the previous packed sequence
+            has_prev &= self.segment_ids.gather(1, prev_real.clamp(min=0)) == self.segment_ids
+        has_prev = has_prev.unsqueeze(-1)
+
+        end_pos = data[..., SVGTensor.IndexArgs.END_POS]
+        start_pos = end_pos.gather(1, prev_real.clamp(min=0).unsqueeze(-1).expand(B, L, 2))
+        start_pos = torch.where(has_prev, start_pos, torch.zeros_like(start_pos))
+
+        data[..., SVGTensor.IndexArgs.CONTROL1] -= start_pos
+        data[..., SVGTensor.IndexArgs.CONTROL2] -= start_pos
+        data[..., SVGTensor.IndexArgs.END_POS] -= start_pos
+
+        mask = self._get_args_mask()
+        data = torch.where(mask, data + self.ARGS_DIM - 1, torch.full_like(data, self.PAD_VAL))
+
+        return data
 
+    def sample_points(self, n=10, padded=True):
+        """Batched SVGTensor.sample_points (see difflib.sampling.sample_points).
+
+        Returns:
+            points: (B, P, 2) zero-padded point sets
+            lengths: (B,) number of valid points per sample
+            or a list of (P_b, 2) point sets if padded=False.
+        """
+        assert not self.is_packed, "unpack packed batches before sampling points"
+        from .sampling import sample_points
+        return sample_points(self.data, n=n, mask=self.mask, padded=padded)
+
+    def embed(self):
+        # (B, L, 19) matrix + positional encoding, restarting at every packed segment
+        return SVGTensor.embed_matrix(self.data, positions=self._positions)
@@ -1,15 +1,19 @@
 import torch
-import matplotlib.pyplot as plt
-import PIL.Image
+import math
 import io
+import os
+import tempfile
 
 
 def set_viewbox(viewbox):
+    import matplotlib.pyplot as plt
     plt.xlim(0, viewbox[0])
     plt.ylim(viewbox[1], 0)
 
 
 def plot_points(p, viewbox=None, show_color=False, show_colorbar=False, image_file=None, return_img=False):
+    import matplotlib.pyplot as plt
+    import PIL.Image
     cm = plt.cm.get_cmap('RdYlBu')
     plt.gca().set_aspect('equal')
     plt.gca().invert_yaxis()
@@ -35,6 +39,7 @@ def plot_points(p, viewbox=None, show_color=False, show_colorbar=False, image_fi
 
 
 def plot_matching(p1, p2, matching, viewbox=None):
+    import matplotlib.pyplot as plt
     plt.gca().set_aspect('equal')
     plt.gca().invert_yaxis()
     plt.axis("off")
@@ -80,23 +85,111 @@ def get_length_distribution(p, normalize=True):
 
     return length_distr
 
-def positional_encoding(length, dim):
+def sample_uniform_points(p, n, lengths=None, return_indices=False, out_lengths=None):
     """
-    Generate sinusoidal positional encoding.
+    Resample polylines uniformly in arc length (searchsorted + linear interpolation between neighbors).
 
     Args:
-        length (int): Number of positions.
-        dim (int): Dimension of the encoding.
+        p (torch.Tensor): Points of shape (N, 2) or batched (B, N, 2).
+        n (int): Number of output points.
+        lengths (torch.Tensor, optional): (B,) number of valid points of each padded polyline.
+        return_indices (bool): Also return the index of the nearest input point of every output point.
+        out_lengths (torch.Tensor, optional): (B,) number of output points of each polyline (<= n); the remaining
+            output points repeat the last point.
 
     Returns:
-        torch.Tensor: Positional encoding of shape (length, dim).
+        torch.Tensor: Resampled points of shape (n, 2) or (B, n, 2).
     """
-    position = torch.arange(length, dtype=torch.float32).unsqueeze(1)
-    div_term = torch.exp(torch.arange(0, dim, 2, dtype=torch.float32) * (-torch.log(torch.tensor(10000.0)) / dim))
-    pe = torch.zeros(length, dim)
+    N = p.size(-2)
+    if N < 2:
+        points = p[..., :1, :].expand(*p.shape[:-2], n, p.size(-1))
+        return (points, torch.zeros(points.shape[:-1], dtype=torch.long, device=p.device)) if return_indices else points
+
+    start, end = p[..., :-1, :], p[..., 1:, :]
+    seg_length = torch.norm(end - start, dim=-1).detach()  # sampling positions are constants, as with argmin matching
+    if lengths is not None:
+        valid = torch.arange(1, N, device=p.device) < lengths.to(p.device).unsqueeze(-1)
+        seg_length = seg_length * valid
+    length_distr = torch.cat([seg_length.new_zeros(*seg_length.shape[:-1], 1), seg_length.cumsum(dim=-1)], dim=-1)
+    length_distr = length_distr / length_distr[..., -1:].clamp(min=1e-12)
+
+    if out_lengths is not None:
+        steps = (out_lengths.to(p.device) - 1).clamp(min=1).unsqueeze(-1)
+        distr_unif = (torch.arange(n, device=p.device) / steps).clamp(max=1.).to(length_distr.dtype)
+    else:
+        distr_unif = torch.linspace(0., 1., n, device=p.device).expand(*length_distr.shape[:-1], n).contiguous()
+    max_idx = (lengths.to(p.device) - 1).clamp(min=1).unsqueeze(-1) if lengths is not None else max(N - 1, 1)
+    idx = torch.searchsorted(length_distr, distr_unif).clamp(min=1)
+    idx = torch.minimum(idx, torch.as_tensor(max_idx, device=p.device)).clamp(max=N - 1)
+
+    d0, d1 = length_distr.gather(-1, idx - 1), length_distr.gather(-1, idx)
+    w = ((distr_unif - d0) / (d1 - d0).clamp(min=1e-12)).clamp(0., 1.)
+    w = torch.where(d1 > d0, w, torch.zeros_like(w)).unsqueeze(-1)
+
+    p0 = p.gather(-2, (idx - 1).unsqueeze(-1).expand(*idx.shape, p.size(-1)))
+    p1 = p.gather(-2, idx.unsqueeze(-1).expand(*idx.shape, p.size(-1)))
+    points = (1 - w) * p0 + w * p1
+
+    if return_indices:
+        return points, torch.where(w.squeeze(-1) >= 0.5, idx, idx - 1)
+    return points
+
+
+_PE_CACHE = {}
+
+
+def _compute_positional_encoding(length, dim, dtype=torch.float32, device=None):
+    position = torch.arange(length, dtype=torch.float32, device=device).unsqueeze(1)
+    div_term = torch.exp(torch.arange(0, dim, 2, dtype=torch.float32, device=device) * (-math.log(10000.0) / dim))
+    pe = torch.zeros(length, dim, device=device)
     pe[:, 0::2] = torch.sin(position * div_term)
     if dim % 2 == 1:
         pe[:, 1::2] = torch.cos(position * div_term)[:, :pe[:, 1::2].shape[1]]
     else:
         pe[:, 1::2] = torch.cos(position * div_term)
-    return pe
+    return pe.to(dtype)
+
+
+def positional_encoding(length, dim, positions=None, dtype=torch.float32, device=None):
+    """
+    Generate sinusoidal positional encoding.
+
+    The table is cached per (dim, dtype, device), grown on demand (at least doubling) and sliced for shorter
+    sequences. The returned tensor is a view of the cache: do not modify it in place.
+
+    Args:
+        length (int): Number of positions.
+        dim (int): Dimension of the encoding.
+        positions (torch.Tensor, optional): Integer positions (< length) of any shape (e.g. restarting at packed
+            segment boundaries). If given, the encoding of each position is returned instead of the (length, dim) table.
+        dtype (torch.dtype): dtype of the encoding.
+        device (torch.device, optional): device of the encoding.
+
+    Returns:
+        torch.Tensor: Positional encoding of shape (length, dim), or (*positions.shape, dim).
+    """
+    device = torch.device(device) if device is not None else torch.device("cpu")
+    key = (dim, dtype, device)
+    table = _PE_CACHE.get(key)
+    if table is None or table.size(0) < length:
+        new_length = max(length, 2 * table.size(0)) if table is not None else length
+        table = _PE_CACHE[key] = _compute_positional_encoding(new_length, dim, dtype=dtype, device=device)
+
+    if positions is not None:
+        return table[positions.to(device).long()]
+    return table[:length]
+
+
+def atomic_write(file_path, write, mode="wb"):
+    """Write file_path through write(f) on a temporary file (mkstemp, ".tmp" suffix) of the same directory, then
+    os.replace it: concurrent writers never see or leave a partial file, the temporary file is removed on error."""
+    dir_path = os.path.dirname(file_path) or "."
+    os.makedirs(dir_path, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=dir_path)
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
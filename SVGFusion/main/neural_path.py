@@ -1 +1,228 @@
-clas
+from __future__ import annotations
+import time
+import numpy as np
+import torch
+from multiprocessing import Pool
+from typing import Iterable, Iterator, List, Union
+from ..difflib.tensor import SVGTensor, SVGTensorBatch
+from ..difflib.dataset import ShardWriter, _svg_to_matrix
+
+# NOTE: ニューラルパス表現変換器 (SVG / SVGTensor <-> 固定長表現)
+# 各行 = [element one-hot (9) | command one-hot (6) | 値 17列 (radius, x_axis_rot, flags, start/control/end, rgba)]
+# 値は [0, 1] に正規化し、PAD_VAL の列は -1 とする（デコード時は < -0.5 を PAD とみなす）。
+# 長さは max_len に揃え、余りの行は EOS 行（element=EOS, 値=-1）とする。
+
+NB_ELEMENTS = len(SVGTensor.ELEMENTS)
+NB_COMMANDS = len(SVGTensor.PATH_COMMANDS)
+VALUE_COLS = slice(SVGTensor.Index.RADIUS.start, SVGTensor.Index.RGBA.stop)
+NB_VALUES = VALUE_COLS.stop - VALUE_COLS.start
+# matrix columns of the CMD_ARGS_MASK slots (everything but start_pos)
+ARGS_COLS = [*range(SVGTensor.Index.RADIUS.start, SVGTensor.Index.START_POS.start),
+             *range(SVGTensor.Index.CONTROL1.start, SVGTensor.Index.END_POS.stop)]
+
+
+def _value_scale(ARGS_DIM=256, max_color=255.):
+    """Divisors mapping the 17 value columns of S_(i,j) to [0, 1]."""
+    Index = SVGTensor.Index
+    scale = torch.full((Index.RGBA.stop,), ARGS_DIM - 1.)
+    scale[Index.X_AXIS_ROT] = 360.
+    scale[Index.LARGE_ARC_FLG] = scale[Index.SWEEP_FLG] = 1.
+    scale[Index.RGBA] = torch.tensor([max_color, max_color, max_color, 1.])
+    return scale[VALUE_COLS]
+
+
+class NeuralPathConverter:
+    """Batched converter between S_(i,j) matrices and fixed-size (max_len, dim) neural path representations.
+
+    Args:
+        max_len (int): Number of rows of every representation.
+        ARGS_DIM (int): Coordinate range of the (numericalized) matrices.
+        truncate (bool): Truncate longer sequences, otherwise raise a ValueError.
+        quantize (bool): Round decoded coordinates to integers (numericalized SVGs).
+    """
+    dim = NB_ELEMENTS + NB_COMMANDS + NB_VALUES
+
+    def __init__(self, max_len=64, ARGS_DIM=256, PAD_VAL=-1, truncate=True, quantize=True):
+        self.max_len = max_len
+        self.ARGS_DIM = ARGS_DIM
+        self.PAD_VAL = PAD_VAL
+        self.truncate = truncate
+        self.quantize = quantize
+        self.scale = _value_scale(ARGS_DIM)
+
+        self.num_truncated = 0
+
+    def _to_matrix(self, sample: Union[SVGTensor, torch.Tensor, "SVG"]) -> torch.Tensor:
+        if isinstance(sample, SVGTensor):
+            matrix = sample.matrix[:int(sample.seq_len)]
+        elif isinstance(sample, torch.Tensor):
+            matrix = sample
+        elif isinstance(sample, np.ndarray):
+            matrix = torch.from_numpy(sample)
+        else:
+            matrix = sample.to_tensor(PAD_VAL=self.PAD_VAL)
+
+        if matrix.size(-1) == SVGTensor.Index.RGBA.start:  # without rgba
+            matrix = torch.cat([matrix, matrix.new_full((matrix.size(0), 4), self.PAD_VAL)], dim=-1)
+        return matrix
+
+    def encode(self, samples: Union[List, SVGTensorBatch]):
+        """Encode SVG, SVGTensor or (L, 19) matrices (or an SVGTensorBatch).
+
+        Returns:
+            representations: (B, max_len, dim)
+            lengths: (B,) number of non padding rows
+        """
+        if isinstance(samples, SVGTensorBatch):
+            data, lengths = samples.data, samples.seq_len
+        else:
+            matrices = [self._to_matrix(s).float() for s in samples]
+            lengths = torch.tensor([m.size(0) for m in matrices], dtype=torch.long)
+            data = torch.nn.utils.rnn.pad_sequence(matrices, batch_first=True, padding_value=self.PAD_VAL) \
+                if matrices else torch.empty(0, 0, SVGTensor.Index.RGBA.stop)
+
+        too_long = lengths > self.max_len
+        if too_long.any():
+            if not self.truncate:
+                raise ValueError(f"Sequence of length {int(lengths.max())} longer than max_len={self.max_len}.")
+            self.num_truncated += int(too_long.sum())
+            lengths = lengths.clamp(max=self.max_len)
+
+        B, L = data.shape[:2]
+        if L < self.max_len:
+            data = torch.cat([data, data.new_full((B, self.max_len - L, data.size(-1)), self.PAD_VAL)], dim=1)
+        data = data[:, :self.max_len]
+        lengths = lengths.to(data.device)
+        valid = torch.arange(self.max_len, device=data.device)[None] < lengths[:, None]
+
+        Index = SVGTensor.Index
+        elements = torch.where(valid, data[..., Index.ELEMENT].long(), SVGTensor.ELEMENTS.index("EOS"))
+        commands = data[..., Index.COMMAND].long()
+        is_command = valid & (commands >= 0)
+
+        rep = data.new_zeros(B, self.max_len, self.dim)
+        rep[..., :NB_ELEMENTS].scatter_(-1, elements.unsqueeze(-1), 1.)
+        rep[..., NB_ELEMENTS:NB_ELEMENTS + NB_COMMANDS].scatter_(-1, commands.clamp(min=0).unsqueeze(-1),
+                                                                 is_command.unsqueeze(-1).to(rep.dtype))
+
+        values = data[..., VALUE_COLS]
+        is_value = valid.unsqueeze(-1) & (values != self.PAD_VAL)
+        # rotations wrapped into [0, 360): negative ones would be normalized below -0.5 and decoded as PAD
+        rot = Index.X_AXIS_ROT - VALUE_COLS.start
+        values = values.clone()
+        values[..., rot] = values[..., rot].remainder(360.)
+        rep[..., NB_ELEMENTS + NB_COMMANDS:] = torch.where(is_value, values / self.scale.to(values), -1.)
+        return rep, lengths
+
+    def decode(self, rep: torch.Tensor, lengths: torch.Tensor = None) -> SVGTensorBatch:
+        """Decode (B, max_len, dim) representations (e.g. VAE outputs) back into an SVGTensorBatch.
+
+        If lengths is None, every sequence ends at its first EOS row.
+        """
+        B, L = rep.shape[:2]
+        elements = rep[..., :NB_ELEMENTS].argmax(dim=-1)
+        command_logits = rep[..., NB_ELEMENTS:NB_ELEMENTS + NB_COMMANDS]
+        commands = torch.where(command_logits.max(dim=-1).values > 0.5, command_logits.argmax(dim=-1), self.PAD_VAL)
+
+        if lengths is None:
+            is_eos = elements == SVGTensor.ELEMENTS.index("EOS")
+            lengths = torch.where(is_eos.any(dim=1), is_eos.int().argmax(dim=1), L)
+        valid = torch.arange(L, device=rep.device)[None] < lengths[:, None]
+
+        values = rep[..., NB_ELEMENTS + NB_COMMANDS:] * self.scale.to(rep)
+        if self.quantize:
+            coords = torch.ones(NB_VALUES, dtype=torch.bool, device=rep.device)
+            coords[SVGTensor.Index.RGBA.stop - 1 - VALUE_COLS.start] = False  # alpha stays continuous
+            values = torch.where(coords, values.round(), values)
+        values = torch.where(rep[..., NB_ELEMENTS + NB_COMMANDS:] < -0.5, float(self.PAD_VAL), values)
+
+        data = torch.cat([elements.unsqueeze(-1).to(rep.dtype), commands.unsqueeze(-1).to(rep.dtype), values], dim=-1)
+        data = torch.where(valid.unsqueeze(-1), data, float(self.PAD_VAL))
+        data[..., SVGTensor.Index.ELEMENT] = torch.where(valid, elements, SVGTensor.ELEMENTS.index("EOS")).to(rep.dtype)
+        return SVGTensorBatch(data, lengths, PAD_VAL=self.PAD_VAL, ARGS_DIM=self.ARGS_DIM)
+
+    def iter_encode(self, samples: Iterable, batch_size=256) -> Iterator:
+        """Streaming encode: yields (representations, lengths) every `batch_size` samples."""
+        buffer = []
+        for sample in samples:
+            buffer.append(sample)
+            if len(buffer) == batch_size:
+                yield self.encode(buffer)
+                buffer = []
+        if buffer:
+            yield self.encode(buffer)
+
+    def convert_corpus(self, svgs: Iterable, root, batch_size=256, shard_size=10000, num_workers=0, chunksize=64,
+                       **to_tensor_kwargs):
+        """Convert SVG objects (or svg file paths) into shards of (max_len, dim) representations.
+
+        SVG parsing and SVG.to_tensor run in a process pool when num_workers > 0; encoding is batched in the
+        main process. The shards can be read back with difflib.dataset.SVGTensorDataset(return_svg_tensor=False).
+
+        Returns:
+            int: number of written samples.
+        """
+        jobs = ((svg, to_tensor_kwargs) for svg in svgs)
+        nb_samples = 0
+        with ShardWriter(root, shard_size=shard_size, dim=self.dim) as writer:
+            def write(matrices):
+                nonlocal nb_samples
+                for rep, _ in self.iter_encode(matrices, batch_size=batch_size):
+                    for r in rep:
+                        writer.add(r)
+                        nb_samples += 1
+
+            if num_workers > 0:
+                with Pool(num_workers) as pool:
+                    write(pool.imap(_svg_to_matrix, jobs, chunksize=chunksize))
+            else:
+                write(map(_svg_to_matrix, jobs))
+        return nb_samples
+
+
+def random_matrices(nb_samples, min_len=4, max_len=64, ARGS_DIM=256, seed=0) -> List[torch.Tensor]:
+    """Random path matrices (m/l/c/a commands, numericalized coordinates) for benchmarks."""
+    g = torch.Generator()
+    g.manual_seed(seed)
+    Index = SVGTensor.Index
+    commands = torch.tensor([SVGTensor.PATH_COMMANDS.index(c) for c in "lca"])
+    matrices = []
+    for L in torch.randint(min_len, max_len + 1, (nb_samples,), generator=g).tolist():
+        m = torch.randint(0, ARGS_DIM, (L, Index.RGBA.stop), generator=g).float()
+        m[:, Index.ELEMENT] = SVGTensor.ELEMENTS.index("path")
+        m[:, Index.COMMAND] = commands[torch.randint(0, len(commands), (L,), generator=g)]
+        m[0, Index.COMMAND] = SVGTensor.PATH_COMMANDS.index("m")
+
+        args_mask = SVGTensor.CMD_ARGS_MASK[m[:, Index.COMMAND].long()].bool()
+        m[:, ARGS_COLS] = torch.where(args_mask, m[:, ARGS_COLS], -1.)
+        flags = m[:, Index.LARGE_ARC_FLG:Index.SWEEP_FLG + 1]
+        m[:, Index.LARGE_ARC_FLG:Index.SWEEP_FLG + 1] = torch.where(flags >= 0, flags % 2, flags)
+        m[:, Index.START_POS] = torch.cat([m.new_zeros(1, 2), m[:-1, Index.END_POS]])
+        m[:, Index.RGBA.stop - 1] = 1.
+        matrices.append(m)
+    return matrices
+
+
+def benchmark(nb_samples=10000, batch_size=256, max_len=64, repeat=3):
+    """Encode/decode throughput (samples/s) on random matrices."""
+    converter = NeuralPathConverter(max_len=max_len)
+    matrices = random_matrices(nb_samples, max_len=max_len)
+    batches = [matrices[i:i + batch_size] for i in range(0, nb_samples, batch_size)]
+
+    def timeit(fn):
+        best = float("inf")
+        for _ in range(repeat):
+            t = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - t)
+        return nb_samples / best
+
+    encoded = [converter.encode(batch) for batch in batches]
+    return {
+        "encode_samples_per_s": timeit(lambda: [converter.encode(batch) for batch in batches]),
+        "decode_samples_per_s": timeit(lambda: [converter.decode(rep, lengths) for rep, lengths in encoded]),
+    }
+
+
+if __name__ == "__main__":
+    print(benchmark())
@@ -0,0 +1,121 @@
+from __future__ import annotations
+import io
+import os
+import numpy as np
+from multiprocessing import Pool
+from typing import List
+from .raster import Canvas, path_points, polyline_edges, stroke_edges, _coverage, _to_pixels, rasterize, _M
+from ..difflib.tensor import SVGTensor
+
+# NOTE: SVG.to_video / animate 用の逐次フレーム生成。
+# 以前は command ごとにそれまでの全 command を含む SVG を cairosvg でレンダリングしていた (command 数の二乗)。
+# ここでは描画済みの command をフレームバッファ (Canvas) に一度だけ合成し、各フレームは
+# バッファのコピー + 現在の command (赤) + 終点の点 を重ねるだけにする。
+# command ごとの被覆率 (raster._coverage) は互いに独立なのでプロセスプールで並列に計算する。
+
+GREY = (128., 128., 128., 1.)
+RED = (255., 0., 0., 1.)
+TEAL = (0., 128., 128., 1.)
+WHITE = (255., 255., 255., 1.)
+
+
+def _rgba(color):
+    # (r, g, b, a) tuple of a color string ("grey", "#808080"...), Color or tuple
+    from .color import Color
+    if isinstance(color, str):
+        color = Color.from_str(color)
+    if isinstance(color, Color):
+        return tuple(float(c) for c in color.rgba)
+    return color
+
+
+def _dot_edges(center, radius, n=8) -> np.ndarray:
+    theta = np.linspace(0, 2 * np.pi, n + 1)
+    points = center + radius * np.stack([np.cos(theta), np.sin(theta)], axis=-1)
+    return polyline_edges(points)
+
+
+def _command_layers(args):
+    # coverage windows (coverage, top, left) of the stroke and the end point dot of one command
+    points, height, width, stroke_width, dot_radius, supersample = args
+    stroke = _coverage(stroke_edges(polyline_edges(points), stroke_width), height, width, "nonzero", supersample)
+    dot = _coverage(_dot_edges(points[-1], dot_radius), height, width, "nonzero", supersample)
+    return stroke, dot
+
+
+def progress_frames(svg, size=256, stroke_width=1.5, dot_radius=1.5, color=GREY, background=WHITE, supersample=4, n=16,
+                    workers=0, chunksize=64) -> List[np.ndarray]:
+    """(H, W, 3) uint8 frames drawing svg one command at a time (same sequence as the former SVGPath.to_video).
+
+    The command being drawn is red, moves are teal, previous commands are drawn in color (RGBA tuple, Color or
+    color string such as "grey").
+    The first frame is empty and the last one is the rendered document.
+
+    Args:
+        size: int or (height, width).
+        stroke_width, dot_radius: in pixels.
+        workers: number of processes computing the command coverages (None: os.cpu_count(), 0: this process).
+    """
+    height, width = (size, size) if isinstance(size, int) else size
+    color, background = _rgba(color), _rgba(background)
+
+    commands = []
+    for path in svg.paths:
+        rows = path.to_tensor()
+        points, cmds = path_points(rows, n)
+        # moves are drawn as a line from their start to their end
+        is_move = cmds == _M
+        points[is_move] = np.linspace(rows[is_move][:, SVGTensor.Index.START_POS].numpy(),
+                                      rows[is_move][:, SVGTensor.Index.END_POS].numpy(), n, axis=1)
+        commands.extend(zip(points, cmds))
+
+    jobs = []
+    for points, _ in commands:
+        points_px = _to_pixels(points.reshape(-1, 4), svg.viewbox, height, width).reshape(-1, 2)
+        jobs.append((points_px, height, width, stroke_width, dot_radius, supersample))
+
+    workers = os.cpu_count() if workers is None else workers
+    if workers > 0 and len(jobs) > chunksize:
+        with Pool(workers) as pool:
+            layers = pool.map(_command_layers, jobs, chunksize=chunksize)
+    else:
+        layers = list(map(_command_layers, jobs))
+
+    def to_frame(canvas):
+        return canvas.to_array(np.uint8)[..., :3]
+
+    def draw(canvas, layer, rgba):
+        coverage, top, left = layer
+        canvas.draw(coverage, rgba, top, left)
+
+    canvas = Canvas(height, width, background)
+    frames = [to_frame(canvas)]
+    for (_, command), (stroke, dot) in zip(commands, layers):
+        frame = canvas.copy()
+        draw(frame, stroke, TEAL if command == _M else RED)
+        draw(frame, dot, RED)
+        frames.append(to_frame(frame))
+
+        # moves are only shown while they are drawn
+        if command != _M:
+            draw(canvas, stroke, color)
+        draw(canvas, dot, color)
+
+    frames.append(rasterize(svg, (height, width), background=background, supersample=supersample, n=n,
+                            dtype=np.uint8)[..., :3])
+    return frames
+
+
+def encode_gif(frames: List[np.ndarray], frame_duration=0.1, loop=0) -> bytes:
+    """GIF bytes of (H, W, 3) uint8 frames."""
+    from PIL import Image
+    images = [Image.fromarray(frame) for frame in frames]
+    f = io.BytesIO()
+    images[0].save(f, format="GIF", save_all=True, append_images=images[1:], duration=int(frame_duration * 1000),
+                   loop=loop, optimize=False)
+    return f.getvalue()
+
+
+def write_gif(frames: List[np.ndarray], file_path, frame_duration=0.1, loop=0):
+    with open(file_path, "wb") as f:
+        f.write(encode_gif(frames, frame_duration=frame_duration, loop=loop))
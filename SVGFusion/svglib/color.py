@@ -14,7 +14,8 @@ class Color:
         if rgb is None:
             rgb = [0, 0, 0] # black
         elif isinstance(rgb, str):
-            rgb, alpha = Color.from_str(rgb)
+            color = Color.from_str(rgb)
+            rgb, alpha = color.rgb, (alpha if alpha is not None else color.a)
         elif len(rgb) > 3:
             rgb = rgb[:3]  # truncate to first 3 elements
         self.rgb = np.array(rgb, dtype=np.float32)
@@ -0,0 +1,252 @@
+from __future__ import annotations
+import argparse
+import copy
+import logging
+import os
+import numpy as np
+from multiprocessing import Pool
+from typing import List, Sequence, Tuple
+from xml.parsers.expat import ExpatError
+
+# NOTE: コーパス内の重複・ほぼ重複した SVG の検出。
+# SVG ごとに 3 種類のシグネチャを計算する。
+#   thumbnail  : raster.rasterize した小さな 2値画像 (bit を packbits した uint8 配列)
+#   descriptor : to_points の点群を重心・RMS 半径で正規化した 2次元ヒストグラム (L2 正規化)
+#   fingerprint: to_path() した文書の fingerprint.fingerprint(quantize=...) の値 (量子化後に完全一致するもの)
+# thumbnail の bit と descriptor の SimHash (ランダム超平面の符号) を band に分けて LSH し、
+# 同じ bucket に入ったものだけを閾値で照合して union-find でクラスタにまとめる (全ペア比較をしない)。
+# 各クラスタでは最も番号の小さいものを残す。
+
+THUMB_SIZE = 16
+GRID = 8
+QUANTIZE = 64
+
+logger = logging.getLogger(__name__)
+
+
+class Signatures:
+    """Signatures of N documents (see the NOTE above)."""
+    def __init__(self, thumbs: np.ndarray, descriptors: np.ndarray, fingerprints: List[str], paths: List[str] = None):
+        self.thumbs = thumbs              # (N, THUMB_SIZE ** 2 / 8) uint8
+        self.descriptors = descriptors    # (N, GRID ** 2) float32
+        self.fingerprints = fingerprints
+        self.paths = paths                # svg files the signatures were computed from (None for SVG objects)
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    def save(self, file_path):
+        arrays = dict(thumbs=self.thumbs, descriptors=self.descriptors, fingerprints=np.array(self.fingerprints))
+        if self.paths is not None:
+            arrays["paths"] = np.array(self.paths)
+        np.savez(file_path, **arrays)
+
+    @staticmethod
+    def load(file_path) -> Signatures:
+        with np.load(file_path) as f:
+            paths = f["paths"].tolist() if "paths" in f.files else None
+            return Signatures(f["thumbs"], f["descriptors"], f["fingerprints"].tolist(), paths)
+
+
+def point_descriptor(points: np.ndarray, grid=GRID) -> np.ndarray:
+    """(grid ** 2,) translation and scale invariant histogram of a point cloud."""
+    if not len(points):
+        return np.zeros(grid * grid, dtype=np.float32)
+    points = points - points.mean(axis=0)
+    rms = np.sqrt((points ** 2).sum(axis=-1).mean())
+    points = points / max(rms, 1e-9)
+    hist, _, _ = np.histogram2d(points[:, 0], points[:, 1], bins=grid, range=[[-2, 2], [-2, 2]])
+    hist = hist.reshape(-1).astype(np.float32)
+    return hist / max(np.linalg.norm(hist), 1e-9)
+
+
+def svg_signature(svg, thumb_size=THUMB_SIZE, grid=GRID, quantize=QUANTIZE) -> Tuple[np.ndarray, np.ndarray, str]:
+    """(thumbnail bits, point descriptor, fingerprint) of an SVG."""
+    from .raster import rasterize
+    alpha = rasterize(svg, thumb_size, supersample=2)[..., 3]
+    thumb = np.packbits(alpha.reshape(-1) > 0.5)
+    descriptor = point_descriptor(svg.to_points(sort=False), grid)
+    # primitives as paths: a <circle> and the same circle drawn as a <path> are duplicates
+    return thumb, descriptor, copy.deepcopy(svg).to_path().fingerprint(quantize=quantize, with_color=False)
+
+
+def _file_signature(args):
+    file_path, thumb_size, grid, quantize = args
+    from .svg import SVG
+    try:
+        svg = SVG.load_svg(file_path)
+    except (OSError, ValueError, ExpatError) as e:
+        # unreadable documents get an empty signature (never matched but kept)
+        logger.warning("Can't read %s: %s", file_path, e)
+        return np.zeros(thumb_size * thumb_size // 8, dtype=np.uint8), np.zeros(grid * grid, dtype=np.float32), f"error:{file_path}"
+    return svg_signature(svg, thumb_size, grid, quantize)
+
+
+def compute_signatures(svgs: Sequence, thumb_size=THUMB_SIZE, grid=GRID, quantize=QUANTIZE, workers=None,
+                       chunksize=64) -> Signatures:
+    """Signatures of SVG objects, or of svg files (paths, loaded in the workers).
+
+    Args:
+        workers: number of processes for file paths (None: os.cpu_count(), 0: this process).
+    """
+    paths = list(svgs) if all(isinstance(svg, str) for svg in svgs) else None
+    if paths is not None:
+        jobs = [(file_path, thumb_size, grid, quantize) for file_path in svgs]
+        workers = os.cpu_count() if workers is None else workers
+        if workers > 0 and len(jobs) > chunksize:
+            with Pool(workers) as pool:
+                signatures = list(pool.imap(_file_signature, jobs, chunksize=chunksize))
+        else:
+            signatures = list(map(_file_signature, jobs))
+    else:
+        signatures = [svg_signature(svg, thumb_size, grid, quantize) for svg in svgs]
+
+    if not signatures:
+        return Signatures(np.zeros((0, thumb_size * thumb_size // 8), dtype=np.uint8), np.zeros((0, grid * grid), dtype=np.float32), [],
+                          paths)
+    thumbs, descriptors, fingerprints = zip(*signatures)
+    return Signatures(np.stack(thumbs), np.stack(descriptors), list(fingerprints), paths)
+
+
+_POPCOUNT = np.array([bin(k).count("1") for k in range(256)], dtype=np.uint8)
+
+
+def _band_keys(bits_t: np.ndarray, bands: int, band_bits: int, rng: np.random.Generator) -> np.ndarray:
+    # (N, bands) int64 keys of randomly sampled bit positions (bit sampling LSH for the Hamming distance).
+    # bits_t is (D, N) so that sampling bit positions gathers contiguous rows
+    keys = np.zeros((bits_t.shape[1], bands), dtype=np.int64)
+    for b in range(bands):
+        packed = np.packbits(bits_t[rng.integers(0, len(bits_t), size=band_bits)], axis=0, bitorder="little")
+        for k in range(len(packed)):
+            keys[:, b] |= packed[k].astype(np.int64) << (8 * k)
+    return keys
+
+
+def _bucket_pairs(keys: np.ndarray) -> np.ndarray:
+    # (P, 2) candidate pairs of every band: each bucket member with the first member and with the previous one,
+    # linear in the bucket size. Buckets are found by sorting; inside a bucket members are ordered by the key of
+    # the next band so that near-duplicates are usually adjacent.
+    pairs = []
+    for b, band in enumerate(keys.T):
+        order = np.lexsort((keys[:, (b + 1) % keys.shape[1]], band))
+        sorted_keys = band[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        sizes = np.diff(np.r_[starts, len(band)])
+        first = np.repeat(order[starts], sizes)
+        member = np.arange(len(band)) != np.repeat(starts, sizes)
+        pairs.append(np.stack([first[member], order[member]], axis=-1))
+        pairs.append(np.stack([order[:-1][member[1:]], order[1:][member[1:]]], axis=-1))
+    return np.concatenate(pairs) if pairs else np.zeros((0, 2), dtype=np.int64)
+
+
+def _connected_components(n: int, pairs: np.ndarray) -> np.ndarray:
+    # (n,) smallest index of the component of every node (min label propagation with pointer jumping)
+    labels = np.arange(n)
+    i, j = pairs.T if len(pairs) else (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+    while True:
+        previous = labels.copy()
+        m = np.minimum(labels[i], labels[j])
+        np.minimum.at(labels, i, m)
+        np.minimum.at(labels, j, m)
+        labels = labels[labels]
+        if np.array_equal(labels, previous):
+            return labels
+
+
+def find_duplicates(signatures: Signatures, max_hamming=0.05, min_cosine=0.95, bands=16, band_bits=24, seed=0) -> np.ndarray:
+    """(N,) cluster labels: index of the kept (first) document of the cluster of every document.
+
+    Two documents are duplicates if their quantized fingerprints are equal, or if they share an LSH bucket and
+    their thumbnails differ in at most max_hamming of the pixels and their descriptors have cosine >= min_cosine.
+    """
+    n = len(signatures)
+    rng = np.random.default_rng(seed)
+    thumbs, descriptors = signatures.thumbs, signatures.descriptors
+    bits_t = np.unpackbits(np.ascontiguousarray(thumbs.T), axis=0)                 # (thumb_size ** 2, N)
+
+    # SimHash bits of the descriptors
+    planes = rng.standard_normal((len(bits_t), descriptors.shape[1])).astype(np.float32)
+    simhash_t = (planes @ descriptors.T > 0).view(np.uint8)
+
+    candidates = np.concatenate([_bucket_pairs(_band_keys(bits_t, bands, band_bits, rng)),
+                                 _bucket_pairs(_band_keys(simhash_t, bands, band_bits, rng))])
+    candidates = np.sort(candidates, axis=-1)
+    codes = np.unique(candidates[:, 0] * n + candidates[:, 1])
+    candidates = np.stack([codes // n, codes % n], axis=-1)
+
+    i, j = candidates.T
+    hamming = _POPCOUNT[thumbs[i] ^ thumbs[j]].sum(axis=-1, dtype=np.int64) / len(bits_t)
+    cosine = (descriptors[i] * descriptors[j]).sum(axis=-1)
+    non_empty = thumbs[i].any(axis=-1)
+    pairs = candidates[(hamming <= max_hamming) & (cosine >= min_cosine) & non_empty]
+
+    # exact matches of the quantized fingerprints
+    first, same = {}, []
+    for idx, fp in enumerate(signatures.fingerprints):
+        if not fp.startswith("error:"):
+            j = first.setdefault(fp, idx)
+            if j != idx:
+                same.append((j, idx))
+    pairs = np.concatenate([pairs, np.array(same, dtype=np.int64).reshape(-1, 2)])
+    return _connected_components(n, pairs)
+
+
+def keep_drop(labels: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Indices of the kept documents and of the dropped ones."""
+    keep = labels == np.arange(len(labels))
+    return np.flatnonzero(keep), np.flatnonzero(~keep)
+
+
+def _list_svgs(inputs: List[str]) -> List[str]:
+    file_paths = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                file_paths.extend(os.path.join(root, f) for f in sorted(files) if f.endswith(".svg"))
+        elif path.endswith(".txt"):
+            with open(path) as f:
+                file_paths.extend(line.strip() for line in f if line.strip())
+        else:
+            file_paths.append(path)
+    return file_paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Near-duplicate detection of svg files.")
+    parser.add_argument("inputs", nargs="+", help="svg files, directories or .txt lists of files")
+    parser.add_argument("--keep", default="keep.txt", help="output list of kept files")
+    parser.add_argument("--drop", default="drop.txt", help="output list of dropped files (file<TAB>kept duplicate)")
+    parser.add_argument("--signatures", default=None, help="npz file to cache the signatures")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--thumb-size", type=int, default=THUMB_SIZE)
+    parser.add_argument("--max-hamming", type=float, default=0.05)
+    parser.add_argument("--min-cosine", type=float, default=0.95)
+    parser.add_argument("--bands", type=int, default=16)
+    parser.add_argument("--band-bits", type=int, default=24)
+    args = parser.parse_args(argv)
+
+    file_paths = _list_svgs(args.inputs)
+    signatures = None
+    if args.signatures is not None and os.path.exists(args.signatures):
+        signatures = Signatures.load(args.signatures)
+        if signatures.paths != file_paths:
+            # computed for other files (or an older cache without paths)
+            print(f"{args.signatures} does not match the input files, recomputing")
+            signatures = None
+    if signatures is None:
+        signatures = compute_signatures(file_paths, thumb_size=args.thumb_size, workers=args.workers)
+        if args.signatures is not None:
+            signatures.save(args.signatures)
+
+    labels = find_duplicates(signatures, max_hamming=args.max_hamming, min_cosine=args.min_cosine, bands=args.bands,
+                             band_bits=args.band_bits)
+    keep, drop = keep_drop(labels)
+    with open(args.keep, "w") as f:
+        f.writelines(f"{file_paths[i]}\n" for i in keep)
+    with open(args.drop, "w") as f:
+        f.writelines(f"{file_paths[i]}\t{file_paths[labels[i]]}\n" for i in drop)
+    print(f"{len(file_paths)} files, {len(keep)} kept, {len(drop)} dropped")
+
+
+if __name__ == "__main__":
+    main()
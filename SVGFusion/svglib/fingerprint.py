@@ -0,0 +1,99 @@
+from __future__ import annotations
+import hashlib
+import numpy as np
+from typing import List
+from .geom import Bbox
+
+# NOTE: SVG / SVGPathGroup / SVGPath の内容ハッシュ (キャッシュのキー用)。
+# command の文字・引数の数値・色・viewbox をまとめて numpy 配列にし、配列のバイト列を一度に blake2b でハッシュする。
+# tolerance (文書座標の単位) を指定すると、数値を tolerance の格子に丸めてからハッシュするので小さな浮動小数点誤差を吸収できる
+# (格子の境界をまたぐ誤差は吸収できない)。quantize=n は viewbox を n 分割した格子 (numericalize と同じ格子) に丸める。
+# オブジェクトの同一性ではなく値だけに依存するので、copy() しても、プロセスをまたいでも同じ値になる。
+# 要素の種類 (クラス名) もハッシュに含める: <circle> と to_path() したパスは to_tensor の ELEMENT 列も to_str のタグも違うので別の値。
+# 形が同じなら同じ値にしたい場合 (重複検出など) は先に to_path() / canonicalize する。
+
+DIGEST_SIZE = 16
+
+
+def _numbers(x: np.ndarray, tolerance=None, offset=0.) -> np.ndarray:
+    # -0.0 and 0.0 hash the same
+    if tolerance is None:
+        return np.asarray(x, dtype=np.float32) + np.float32(0.)
+    return np.rint((np.asarray(x, dtype=np.float64) - offset) / tolerance).astype(np.int64)
+
+
+def _color_array(geom) -> np.ndarray:
+    # fill rgba, stroke rgba, stroke_width (nan where undefined)
+    fill, stroke = geom.fill, getattr(geom, "stroke", None)
+    values = np.full(9, np.nan, dtype=np.float32)
+    if fill:
+        values[:4] = fill.rgba
+    if stroke:
+        values[4:8] = stroke.rgba
+        values[8] = float(geom.stroke_width)
+    return values
+
+
+def _update_paths(h, paths, tolerance=None, viewbox: Bbox = None):
+    from .serialize import _command_letters_and_numbers
+    letters, counts, numbers, axes, _, path_sizes = _command_letters_and_numbers(paths)
+
+    # positions are relative to the viewbox origin when quantizing on the viewbox grid
+    offset = 0.
+    if tolerance is not None and viewbox is not None:
+        offset = np.where(axes < 0, 0., viewbox.xy.pos[np.clip(axes, 0, 1)])
+
+    h.update(np.array(path_sizes, dtype=np.int32).tobytes())
+    h.update("".join(letters).encode())
+    h.update(np.array(counts, dtype=np.int32).tobytes())
+    h.update(_numbers(numbers.astype(np.float32), tolerance, offset).tobytes())
+
+
+def _paths_and_colors(obj, element=None) -> List[tuple]:
+    # (element class name, group, paths) of an SVG, SVGPathGroup or primitive, primitives are converted with to_path()
+    if hasattr(obj, "svg_path_groups"):
+        return [item for group in obj.svg_path_groups for item in _paths_and_colors(group)]
+    if isinstance(obj, list):
+        return [item for group in obj for item in _paths_and_colors(group)]
+    if hasattr(obj, "svg_paths"):
+        return [(element or type(obj).__name__, obj, obj.svg_paths)]
+    if hasattr(obj, "to_path"):
+        return _paths_and_colors(obj.to_path(), element=type(obj).__name__)
+    return []
+
+
+def fingerprint(obj, tolerance: float = None, quantize: int = None, with_color=True, with_viewbox=True,
+                digest_size=DIGEST_SIZE) -> str:
+    """Hex content hash of an SVG, SVGPathGroup (or primitive) or SVGPath.
+
+    Args:
+        tolerance: round every number to a multiple of tolerance (document units) before hashing.
+        quantize: round positions to the grid of numericalize(n=quantize) (viewbox / quantize), SVG only.
+        with_color: include fill / stroke colors and stroke width.
+        with_viewbox: include the viewbox (SVG only).
+    """
+    h = hashlib.blake2b(digest_size=digest_size)
+    viewbox = getattr(obj, "viewbox", None)
+
+    if quantize is not None:
+        if viewbox is None:
+            raise ValueError("quantize requires an SVG (with a viewbox), use tolerance instead.")
+        tolerance = float(viewbox.wh.pos.max()) / quantize
+
+    if with_viewbox and viewbox is not None:
+        h.update(_numbers(np.concatenate([viewbox.xy.pos, viewbox.wh.pos]), tolerance).tobytes())
+
+    if hasattr(obj, "all_commands"):
+        # SVGPath
+        _update_paths(h, [obj], tolerance, viewbox)
+        if with_color:
+            h.update(_color_array(obj).tobytes())
+        return h.hexdigest()
+
+    for element, group, paths in _paths_and_colors(obj):
+        h.update(b"g" + element.encode())
+        _update_paths(h, paths, tolerance, viewbox)
+        if with_color:
+            # path level colors override the group colors
+            h.update(np.stack([_color_array(group), *(_color_array(path) for path in paths)]).tobytes())
+    return h.hexdigest()
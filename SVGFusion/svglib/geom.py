@@ -428,6 +428,10 @@ class Angle(Geom):
     def to_str(self):
         return str(self.deg)
 
+    def numericalize(self, n=256):
+        # integer degrees in [0, 360)
+        self.deg = float(np.round(self.deg) % 360)
+
     def to_tensor(self):
         return torch.tensor([self.deg])
 
@@ -550,7 +550,10 @@ class SVGCommandArc(SVGCommand):
         return SVGCommandArc(self.end_pos, self.radius, self.x_axis_rotation, self.large_arc_flag, ~self.sweep_flag, self.start_pos)
 
     def numericalize(self, n=256):
-        raise NotImplementedError
+        self.start_pos.numericalize(n)
+        self.radius.numericalize(n)
+        self.x_axis_rotation.numericalize(n)
+        self.end_pos.numericalize(n)
 
     def get_geoms(self):
         return [self.start_pos, self.radius, self.x_axis_rotation, self.large_arc_flag, self.sweep_flag, self.end_pos]
@@ -14,12 +14,15 @@ class SVGGeometry:
     """
     def __init__(self, fill="black", stroke=None, stroke_width=".3", fill_opacity=None, stroke_opacity=None):
         # if None -> color is (-1,-1,-1,-1) , where -1 is padding value
+        # "none" (fill="none" etc.) is the same as no color
+        fill = None if fill == "none" else fill
+        stroke = None if stroke == "none" else stroke
         if isinstance(fill, Color):
             self.fill = fill
         else:
             self.fill = Color(fill, fill_opacity) if fill is not None else None # NOTE: fillに文字解析
         if isinstance(stroke, Color):
-            self.storke = stroke
+            self.stroke = stroke
         else:
             self.stroke = Color(stroke, stroke_opacity) if stroke is not None else None
         self.stroke_width = stroke_width
@@ -5,7 +5,6 @@ import torch
 from typing import List, Union
 from xml.dom import minidom
 import math
-import shapely.geometry
 import numpy as np
 
 from ...geom import union_bbox
@@ -206,6 +205,10 @@ class SVGPath(SVGGeometry):
     def to_tensor(self, PAD_VAL=-1):
         return torch.stack([command.to_tensor(PAD_VAL=PAD_VAL) for command in self.all_commands()])
 
+    def fingerprint(self, tolerance=None, **kwargs) -> str:
+        from ...fingerprint import fingerprint
+        return fingerprint(self, tolerance=tolerance, **kwargs)
+
     def _get_viz_elements(self, with_points=False, with_handles=False, with_bboxes=False, color_firstlast=False, with_moves=True):
         points = self._get_points_viz(color_firstlast, with_moves) if with_points else ()
         handles = self._get_handles_viz() if with_handles else ()
@@ -354,39 +357,6 @@ class SVGPath(SVGGeometry):
 
         return self
 
-    def to_video(self, wrapper, clips=None, svg_commands=None, color="grey"):
-        from ...svg import SVG
-        from .svg_primitives import SVGLine, SVGCircle
-
-        if clips is None:
-            clips = []
-        if svg_commands is None:
-            svg_commands = []
-        svg_dots, svg_moves = [], []
-
-        for command in self.all_commands():
-            start_pos, end_pos = command.start_pos, command.end_pos
-
-            if isinstance(command, SVGCommandMove):
-                move = SVGLine(start_pos, end_pos, color="teal", dasharray=0.5)
-                svg_moves.append(move)
-
-            dot = SVGCircle(end_pos, radius=Radius(0.1), color="red")
-            svg_dots.append(dot)
-
-            svg_path = SVGPath(svg_commands).to_group(color=color)
-            svg_new_path = SVGPath([SVGCommandMove(start_pos), command]).to_group(color="red")
-
-            svg_paths = [svg_path, svg_new_path]  if svg_commands else [svg_new_path]
-            im = SVG([*svg_paths, *svg_moves, *svg_dots]).draw(do_display=False, return_png=True, with_points=False)
-            clips.append(wrapper(np.array(im)))
-
-            svg_dots[-1].color = "grey"
-            svg_commands.append(command)
-            svg_moves = []
-
-        return clips, svg_commands
-
     def numericalize(self, n=256):
         for command in self.all_commands():
             command.numericalize(n)
@@ -683,6 +653,7 @@ class SVGPath(SVGGeometry):
         return points
 
     def to_shapely(self):
+        import shapely.geometry
         polygon = shapely.geometry.Polygon(self.sample_points())
 
         if not polygon.is_valid:
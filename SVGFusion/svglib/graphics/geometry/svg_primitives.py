@@ -8,9 +8,6 @@ from typing import List, Union
 from xml.dom import minidom
 from .svg_path import SVGPath
 from .svg_command import SVGCommandLine, SVGCommandArc, SVGCommandBezier, SVGCommandClose
-import shapely
-import shapely.ops
-import networkx as nx
 
 from ....difflib.tensor import SVGTensor
 from .svg_geometry import SVGGeometry
@@ -316,6 +313,10 @@ class SVGPathGroup(SVGGeometry):
     def to_tensor(self, PAD_VAL=-1):
         return torch.cat([p.to_tensor(PAD_VAL=PAD_VAL) for p in self.svg_paths], dim=0)
     
+    def fingerprint(self, tolerance=None, **kwargs) -> str:
+        from ...fingerprint import fingerprint
+        return fingerprint(self, tolerance=tolerance, **kwargs)
+
     def to_color_tensor(self, PAD_VAL=-1):
         # path level colors -> group level colors
 
@@ -422,6 +423,7 @@ class SVGPathGroup(SVGGeometry):
         return union_bbox([path.bbox() for path in self.svg_paths])
 
     def to_shapely(self):
+        import shapely.ops
         return shapely.ops.unary_union([path.to_shapely() for path in self.svg_paths])
 
     def compute_filling(self):
@@ -455,6 +457,7 @@ class SVGPathGroup(SVGGeometry):
         return self
 
     def overlap_graph(self, threshold=0.9, draw=False):
+        import networkx as nx
         G = nx.DiGraph()
         shapes = [path.to_shapely() for path in self.svg_paths]
 
@@ -0,0 +1,324 @@
+from __future__ import annotations
+import numpy as np
+import torch
+from typing import List, Tuple, Union
+from .geom import Bbox
+from ..difflib.tensor import SVGTensor
+from ..difflib.sampling import get_sample_basis, _sample_arcs
+
+# NOTE: numpy だけのスキャンラインラスタライザ（cairosvg を経由しない学習時プレビュー・画像空間の指標用）。
+# 1. 各行 (S_(i,j) の layout) を n 点にサンプリングして折れ線 (辺の集合) にする。輪郭は塗りのために閉じる。
+# 2. スーパーサンプリングしたグリッドで、辺と各走査線 (画素中心) の交点に符号 (winding) を加算し、x方向の累積和で内外判定する。
+#    nonzero: winding != 0, evenodd: 交点数が奇数
+# 3. 被覆率 (s x s の平均) × alpha で要素順に合成する (premultiplied over)。
+# stroke は線分ごとの四角形 (両端を w/2 延長) の nonzero の和集合として塗る。
+
+Edges = np.ndarray  # (E, 4): x0, y0, x1, y1
+
+_M = SVGTensor.PATH_COMMANDS.index("m")
+_L = SVGTensor.PATH_COMMANDS.index("l")
+_A = SVGTensor.PATH_COMMANDS.index("a")
+_Z = SVGTensor.PATH_COMMANDS.index("z")
+_PATH = SVGTensor.ELEMENTS.index("path")
+
+_BASIS_CACHE = {}
+
+
+def _sample_basis(n):
+    # difflib.sampling basis as numpy arrays
+    if n not in _BASIS_CACHE:
+        Z, Q = get_sample_basis(n)
+        _BASIS_CACHE[n] = Z.numpy().astype(np.float64), Q.numpy().astype(np.float64)
+    return _BASIS_CACHE[n]
+
+
+def _sample_rows(rows: np.ndarray, n: int) -> np.ndarray:
+    """(L, n, 2) points of every path row (m rows are a single repeated point, z rows are lines)."""
+    Index = SVGTensor.Index
+    Z, Q = _sample_basis(n)
+    commands = rows[:, Index.COMMAND].astype(np.int64)
+    Q = Q[np.where(commands == _Z, _L, commands.clip(min=0))]
+    pos = rows[:, Index.START_POS.start:Index.END_POS.stop].reshape(-1, 4, 2)
+    points = Z @ (Q @ pos)
+
+    is_arc = commands == _A
+    if is_arc.any():
+        points[is_arc] = _sample_arcs(torch.from_numpy(rows[is_arc]), torch.from_numpy(Z[:, 1])).numpy()
+    is_move = commands == _M
+    points[is_move] = rows[is_move][:, None, Index.END_POS]
+    return points
+
+
+def path_points(rows: Union[np.ndarray, torch.Tensor], n=16) -> Tuple[np.ndarray, np.ndarray]:
+    """Points of every row of a path given as (L, 15 or 19) rows with explicit start_pos.
+
+    Returns:
+        points: (L, n, 2), z rows end at the start of their contour.
+        commands: (L,) command indices.
+    """
+    Index = SVGTensor.Index
+    rows = np.array(rows.detach().cpu() if isinstance(rows, torch.Tensor) else rows, dtype=np.float64)
+    commands = rows[:, Index.COMMAND].astype(np.int64)
+
+    # z goes back to the end point of the last m row (SVGPath.to_tensor leaves it at the origin)
+    last_move = np.maximum.accumulate(np.where(commands == _M, np.arange(len(commands)), 0))
+    is_close = commands == _Z
+    rows[is_close, Index.END_POS] = rows[last_move[is_close], Index.END_POS]
+    return _sample_rows(rows, n), commands
+
+
+def polyline_edges(points: np.ndarray) -> Edges:
+    """(..., n, 2) polylines to the edges between consecutive points."""
+    return np.concatenate([points[..., :-1, :], points[..., 1:, :]], axis=-1).reshape(-1, 4)
+
+
+def path_edges(rows: Union[np.ndarray, torch.Tensor], n=16) -> Tuple[Edges, Edges]:
+    """Edges of a path given as (L, 15 or 19) rows with explicit start_pos.
+
+    Returns:
+        fill_edges: segments plus the edge closing every contour.
+        stroke_edges: segments only.
+    """
+    points, commands = path_points(rows, n)
+    drawn = (commands >= 0) & (commands != _M)
+    if not drawn.any():
+        return np.zeros((0, 4)), np.zeros((0, 4))
+    points = points[drawn]                                                      # (K, n, 2)
+    segments = polyline_edges(points)
+
+    # contours start at m rows; close them from the last end point to the first start point
+    contour = np.cumsum(commands == _M)[drawn]
+    _, first = np.unique(contour, return_index=True)
+    last = np.append(first[1:], len(contour)) - 1
+    closing = np.concatenate([points[last, -1], points[first, 0]], axis=-1)
+
+    return np.concatenate([segments, closing]), segments
+
+
+def stroke_edges(segments: Edges, width: float) -> Edges:
+    """Edges of the union (nonzero rule) of one rectangle per segment, extended by width / 2 at both ends."""
+    p0, p1 = segments[:, :2], segments[:, 2:]
+    d = p1 - p0
+    length = np.linalg.norm(d, axis=-1, keepdims=True)
+    keep = length[:, 0] > 1e-12
+    p0, p1, d, length = p0[keep], p1[keep], d[keep], length[keep]
+    u = d / length * (width / 2)
+    nrm = np.stack([-u[:, 1], u[:, 0]], axis=-1)
+    p0, p1 = p0 - u, p1 + u
+    corners = np.stack([p0 + nrm, p1 + nrm, p1 - nrm, p0 - nrm], axis=1)       # (K, 4, 2), same orientation
+    return np.concatenate([corners, np.roll(corners, -1, axis=1)], axis=-1).reshape(-1, 4)
+
+
+def _coverage(edges: Edges, height: int, width: int, fill_rule="nonzero", supersample=4):
+    # coverage restricted to the pixel bounding box of the edges: (window, top, left)
+    if fill_rule not in ("nonzero", "evenodd"):
+        raise ValueError(f"Unknown fill rule: {fill_rule}. Expected nonzero or evenodd.")
+    s = supersample
+    edges = edges[edges[:, 1] != edges[:, 3]]
+    if not len(edges):
+        return np.zeros((0, 0), dtype=np.float32), 0, 0
+    top, bottom = np.clip([np.floor(edges[:, 1::2].min()), np.ceil(edges[:, 1::2].max())], 0, height).astype(int)
+    left, right = np.clip([np.floor(edges[:, 0::2].min()), np.ceil(edges[:, 0::2].max())], 0, width).astype(int)
+    H, W = (bottom - top) * s, (right - left) * s
+    if H == 0 or W == 0:
+        return np.zeros((0, 0), dtype=np.float32), 0, 0
+    x0, y0, x1, y1 = ((edges - [left, top, left, top]) * s).T
+
+    # sample rows whose center (r + 0.5) lies in [min(y0, y1), max(y0, y1))
+    r0 = np.clip(np.ceil(np.minimum(y0, y1) - 0.5), 0, H).astype(np.int64)
+    r1 = np.clip(np.ceil(np.maximum(y0, y1) - 0.5), 0, H).astype(np.int64)
+    counts = r1 - r0
+    edge_ids = np.repeat(np.arange(len(counts)), counts)
+    rows = r0[edge_ids] + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    t = (rows + 0.5 - y0[edge_ids]) / (y1 - y0)[edge_ids]
+    x = x0[edge_ids] + t * (x1 - x0)[edge_ids]
+    cols = np.clip(np.ceil(x - 0.5), 0, W).astype(np.int64)  # first sample column right of the crossing
+
+    if fill_rule == "nonzero":
+        weights = np.where(y1 > y0, 1, -1)[edge_ids]
+        acc = np.bincount(rows * (W + 1) + cols, weights=weights, minlength=H * (W + 1))
+    else:
+        acc = np.bincount(rows * (W + 1) + cols, minlength=H * (W + 1))
+    winding = np.cumsum(acc.astype(np.int16).reshape(H, W + 1)[:, :W], axis=1, dtype=np.int16)
+
+    inside = (winding != 0 if fill_rule == "nonzero" else (winding & 1).astype(bool)).view(np.uint8)
+    count_dtype = np.uint8 if s * s < 256 else np.int32
+    count = inside.reshape(H, W // s, s).sum(-1, dtype=count_dtype).reshape(H // s, s, W // s).sum(1, dtype=count_dtype)
+    coverage = count * np.float32(1 / s ** 2)
+    return coverage, top, left
+
+
+def rasterize_edges(edges: Edges, height: int, width: int, fill_rule="nonzero", supersample=4) -> np.ndarray:
+    """(height, width) float32 coverage of the region bounded by edges (given in pixel coordinates)."""
+    window, top, left = _coverage(edges, height, width, fill_rule, supersample)
+    coverage = np.zeros((height, width), dtype=np.float32)
+    coverage[top:top + window.shape[0], left:left + window.shape[1]] = window
+    return coverage
+
+
+class Canvas:
+    """Premultiplied RGBA accumulation of coverage masks (source-over)."""
+    def __init__(self, height, width, background=None):
+        self.rgba = np.zeros((height, width, 4), dtype=np.float32)
+        if background is not None:
+            self.draw(np.ones((height, width), dtype=np.float32), background)
+
+    def draw(self, coverage: np.ndarray, rgba, top=0, left=0):
+        # rgba: r, g, b in [0, 255], a in [0, 1]; coverage is placed at (top, left)
+        window = self.rgba[top:top + coverage.shape[0], left:left + coverage.shape[1]]
+        a = (coverage * np.float32(rgba[3]))[..., None]
+        color = np.array([rgba[0] / 255., rgba[1] / 255., rgba[2] / 255., 1.], dtype=np.float32)
+        window *= 1 - a
+        window += a * color
+
+    def copy(self) -> Canvas:
+        canvas = Canvas.__new__(Canvas)
+        canvas.rgba = self.rgba.copy()
+        return canvas
+
+    def to_array(self, dtype=np.float32) -> np.ndarray:
+        out = self.rgba.copy()
+        alpha = out[..., 3:]
+        if not (alpha == 1).all():
+            np.divide(out[..., :3], alpha, out=out[..., :3], where=alpha > 0)
+        if dtype == np.uint8:
+            out *= 255
+            out += 0.5
+            return out.clip(0, 255, out=out).astype(np.uint8)
+        return out
+
+
+def _to_pixels(edges: Edges, viewbox: Bbox, height, width) -> Edges:
+    (x, y), (w, h) = viewbox.xy.pos, viewbox.wh.pos
+    scale = np.array([width / w, height / h, width / w, height / h])
+    return (edges - np.array([x, y, x, y])) * scale
+
+
+def _color(color):
+    return None if not color else (*color.rgb.tolist(), float(color.a))
+
+
+def _svg_items(svg) -> List[tuple]:
+    # (rows, fill rgba, stroke rgba, stroke width) of every path, in drawing order
+    items = []
+
+    def visit(group):
+        if isinstance(group, list):
+            for g in group:
+                visit(g)
+        elif hasattr(group, "svg_paths"):
+            for path in group.svg_paths:
+                owner = path if path._get_color_text() else group
+                stroke = getattr(owner, "stroke", None)
+                items.append((path.to_tensor(), _color(owner.fill), _color(stroke), float(owner.stroke_width)))
+        elif hasattr(group, "to_path"):
+            visit(group.to_path())
+    for group in svg.svg_path_groups:
+        visit(group)
+    return items
+
+
+def _primitive_rows(row: np.ndarray, n=32) -> np.ndarray:
+    # path rows of a rect / circle / ellipse / line row (column layout of the svg_primitives to_tensor methods)
+    Index = SVGTensor.Index
+    element = SVGTensor.ELEMENTS[int(row[Index.ELEMENT])]
+    start, c1, r = row[Index.START_POS], row[Index.CONTROL1], row[Index.RADIUS]
+    if element == "rect":
+        points = start + c1 * np.array([[0., 0.], [1., 0.], [1., 1.], [0., 1.]])
+    elif element in ("circle", "ellipse"):
+        r = r if element == "ellipse" else r[[0, 0]]
+        theta = np.linspace(0, 2 * np.pi, n, endpoint=False)
+        points = start + r * np.stack([np.cos(theta), np.sin(theta)], axis=-1)
+    elif element in ("line", "polyline", "polygon"):
+        points = np.stack([start, row[Index.END_POS]])
+    else:
+        return np.zeros((0, len(row)))
+
+    rows = np.full((len(points) + 1, len(row)), -1.)
+    rows[:, Index.ELEMENT] = _PATH
+    rows[0, Index.COMMAND] = _M
+    rows[1:, Index.COMMAND] = _L
+    rows[0, Index.END_POS] = points[0]
+    rows[1:, Index.START_POS] = points
+    rows[1:, Index.END_POS] = np.roll(points, -1, axis=0)
+    if element in ("line", "polyline", "polygon"):
+        rows = rows[:2]
+    return rows
+
+
+def _tensor_items(data: Union[np.ndarray, torch.Tensor], PAD_VAL=-1) -> List[tuple]:
+    # consecutive path rows with the same RGBA form one element; PAD color is black (SVG default fill)
+    Index = SVGTensor.Index
+    data = np.array(data.detach().cpu() if isinstance(data, torch.Tensor) else data, dtype=np.float64)
+    if data.shape[-1] == Index.RGBA.start:
+        data = np.concatenate([data, np.full((len(data), 4), float(PAD_VAL))], axis=-1)
+    elements = data[:, Index.ELEMENT].astype(np.int64)
+    data = data[(elements != SVGTensor.ELEMENTS.index("EOS")) & (elements != SVGTensor.ELEMENTS.index("SOS"))]
+    if not len(data):
+        return []
+
+    # explicit start_pos, as in SVGTensor.start_pos
+    is_path = (data[:, Index.ELEMENT].astype(np.int64) == _PATH) & (data[:, Index.COMMAND] >= 0)
+    data[1:, Index.START_POS][is_path[1:]] = data[:-1, Index.END_POS][is_path[1:]]
+    data[0, Index.START_POS] = np.where(is_path[0], 0., data[0, Index.START_POS])
+
+    # element boundaries: every non path row, and path rows whose color differs from the previous row
+    rgba = data[:, Index.RGBA]
+    continued = np.zeros(len(data), dtype=bool)
+    continued[1:] = is_path[1:] & is_path[:-1] & (rgba[1:] == rgba[:-1]).all(axis=-1)
+    starts = np.flatnonzero(~continued).tolist()
+
+    items = []
+    for i, j in zip(starts, starts[1:] + [len(data)]):
+        color = (0., 0., 0., 1.) if (rgba[i] == PAD_VAL).all() else tuple(rgba[i].tolist())
+        if is_path[i]:
+            items.append((data[i:j], color, None, 0.))
+        else:
+            is_line = SVGTensor.ELEMENTS[int(data[i, Index.ELEMENT])] in ("line", "polyline", "polygon")
+            items.append((_primitive_rows(data[i]), None if is_line else color, color if is_line else None, 1.))
+    return items
+
+
+def rasterize(sample: Union["SVG", SVGTensor, torch.Tensor], size: Union[int, Tuple[int, int]] = 64, viewbox: Bbox = None,
+              fill_rule="nonzero", supersample=4, n=16, background=None, dtype=np.float32, ARGS_DIM=256) -> np.ndarray:
+    """Rasterize an SVG, SVGTensor or (L, 19) tensor to an (H, W, 4) RGBA array (straight alpha).
+
+    Args:
+        size: int or (height, width).
+        viewbox: defaults to svg.viewbox, or Bbox(ARGS_DIM) for tensors (numericalized coordinates).
+        fill_rule: "nonzero" or "evenodd".
+        supersample: samples per pixel along each axis (anti-aliasing).
+        n: points per curve command.
+        background: RGBA (r, g, b in [0, 255], a in [0, 1]) drawn first, transparent if None.
+        dtype: np.float32 ([0, 1]) or np.uint8.
+    """
+    height, width = (size, size) if isinstance(size, int) else size
+    if isinstance(sample, SVGTensor):
+        sample = sample.matrix[:int(sample.seq_len)]
+    if isinstance(sample, torch.Tensor):
+        items = _tensor_items(sample)
+        viewbox = viewbox if viewbox is not None else Bbox(ARGS_DIM)
+    else:
+        items = _svg_items(sample)
+        viewbox = viewbox if viewbox is not None else sample.viewbox
+
+    canvas = Canvas(height, width, background)
+    px_per_unit = width / float(viewbox.wh.pos[0])
+    for rows, fill, stroke, stroke_width in items:
+        fill_edges, segments = path_edges(rows, n=n)
+        if fill is not None and len(fill_edges):
+            coverage, top, left = _coverage(_to_pixels(fill_edges, viewbox, height, width), height, width, fill_rule, supersample)
+            canvas.draw(coverage, fill, top, left)
+        if stroke is not None and len(segments):
+            edges = stroke_edges(_to_pixels(segments, viewbox, height, width), stroke_width * px_per_unit)
+            coverage, top, left = _coverage(edges, height, width, "nonzero", supersample)
+            canvas.draw(coverage, stroke, top, left)
+    return canvas.to_array(dtype)
+
+
+def rasterize_many(samples, *args, **kwargs) -> np.ndarray:
+    """(B, H, W, 4) stack of rasterize() for a list of samples (or an SVGTensorBatch)."""
+    if hasattr(samples, "to_svg_tensors"):
+        samples = samples.to_svg_tensors()
+    return np.stack([rasterize(sample, *args, **kwargs) for sample in samples])
@@ -0,0 +1,107 @@
+from __future__ import annotations
+import hashlib
+import io
+import os
+import numpy as np
+import torch
+from multiprocessing import Pool
+from typing import List, Sequence, Union
+from ..difflib.utils import atomic_write
+
+# NOTE: 複数の SVG をプロセスプールで PNG にレンダリングする。
+# 文字列化はメインプロセスで行い（SVG オブジェクトを pickle しない）、ワーカーは cairosvg だけを呼ぶ。
+# cache_dir を指定すると、SVG 文字列 + レンダリング設定のハッシュをキーに PNG を保存し、次回以降は再利用する。
+
+
+def _to_svg_str(svg, ARGS_DIM=256) -> str:
+    if isinstance(svg, str):
+        return svg
+    from ..difflib.tensor import SVGTensor
+    if isinstance(svg, (torch.Tensor, SVGTensor)):
+        from .serialize import tensor_to_svg_str
+        return tensor_to_svg_str(svg, ARGS_DIM=ARGS_DIM)
+    return svg.to_str()
+
+
+def render_key(svg_str: str, size=None, background=None) -> str:
+    """Content hash of a document and its rendering settings."""
+    h = hashlib.sha1(f"{size}|{background}|".encode())
+    h.update(svg_str.encode())
+    return h.hexdigest()
+
+
+def _cache_path(cache_dir, key):
+    return os.path.join(cache_dir, key[:2], key + ".png")
+
+
+def _write_bytes(file_path, data: bytes):
+    # atomic write, concurrent renders of the same document (other processes or threads) never leave a partial file
+    atomic_write(file_path, lambda f: f.write(data))
+
+
+def _render_png(args) -> bytes:
+    svg_str, size, background = args
+    import cairosvg
+    return cairosvg.svg2png(bytestring=svg_str.encode(), output_width=size, output_height=size,
+                            background_color=background)
+
+
+def png_to_array(png: bytes) -> np.ndarray:
+    """(H, W, 4) uint8 RGBA array of a PNG."""
+    from PIL import Image
+    return np.array(Image.open(io.BytesIO(png)).convert("RGBA"))
+
+
+def render_many(svgs: Sequence, size: int = 256, workers: int = None, out_dir=None, cache_dir=None, return_arrays=True,
+                background=None, chunksize=4, name_format="{:06d}.png") -> List[Union[np.ndarray, str]]:
+    """Render SVG objects, svg strings or SVGTensor / (L, 19) tensors to PNG with a process pool.
+
+    Args:
+        size: output width and height in pixels (None: size of the document).
+        workers: number of processes (None: os.cpu_count(), 0: render in this process).
+        out_dir: if given, PNG files are written there (name_format.format(index)).
+        cache_dir: content-hash keyed PNG cache; documents found there are not rendered again.
+        return_arrays: return (H, W, 4) uint8 arrays, otherwise the written PNG paths (out_dir or cache_dir required).
+        background: cairosvg background_color (e.g. "white"), transparent if None.
+    """
+    if not return_arrays and out_dir is None and cache_dir is None:
+        raise ValueError("return_arrays=False requires out_dir or cache_dir.")
+
+    svg_strs = [_to_svg_str(svg) for svg in svgs]
+    keys = [render_key(s, size, background) for s in svg_strs]
+    pngs = [None] * len(svg_strs)
+
+    # cache lookup; identical documents are rendered once
+    todo = {}
+    for i, key in enumerate(keys):
+        if cache_dir is not None and os.path.exists(_cache_path(cache_dir, key)):
+            with open(_cache_path(cache_dir, key), "rb") as f:
+                pngs[i] = f.read()
+        elif key not in todo:
+            todo[key] = i
+
+    jobs = [(svg_strs[i], size, background) for i in todo.values()]
+    workers = os.cpu_count() if workers is None else workers
+    if workers > 0 and len(jobs) > 1:
+        with Pool(min(workers, len(jobs))) as pool:
+            rendered = pool.map(_render_png, jobs, chunksize=chunksize)
+    else:
+        rendered = list(map(_render_png, jobs))
+
+    rendered = dict(zip(todo.keys(), rendered))
+    for key, png in rendered.items():
+        if cache_dir is not None:
+            _write_bytes(_cache_path(cache_dir, key), png)
+    for i, key in enumerate(keys):
+        if pngs[i] is None:
+            pngs[i] = rendered[key]
+
+    file_paths = None
+    if out_dir is not None:
+        file_paths = [os.path.join(out_dir, name_format.format(i)) for i in range(len(pngs))]
+        for file_path, png in zip(file_paths, pngs):
+            _write_bytes(file_path, png)
+
+    if return_arrays:
+        return [png_to_array(png) for png in pngs]
+    return file_paths if file_paths is not None else [_cache_path(cache_dir, key) for key in keys]
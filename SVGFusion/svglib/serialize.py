@@ -0,0 +1,379 @@
+from __future__ import annotations
+import os
+import numpy as np
+import torch
+from typing import IO, Iterable, Iterator, List, Union
+from .geom import Bbox, Point, Radius, Angle, Flag, Coord
+from ..difflib.tensor import SVGTensor, SVGTensorBatch
+
+# NOTE: S_(i,j) テンソルから SVG 文字列を直接生成する（SVG.from_tensor でオブジェクトを組み立てずに済む）。
+# 数値の整形はバッチ内の全行でまとめて numpy で行う。
+# 連続する path 行（同じ色）を一つの <path> に、それ以外の要素は一行ずつ <rect> などに変換する。
+# SVG オブジェクトの書き出し (SVG.to_str / save_svg) は iter_svg_str で文字列の断片をジェネレータとして返す。
+# パスの数値は chunk_size パスごとにまとめて整形する。
+# precision=None (かつ compact=False) の書き出しは従来の to_str と同じ str(float) の表記 ("0.0", フラグだけ整数)。
+# 短い表記 ("0") は precision を指定するか compact=True のときだけ。
+
+VIEW_SIZE = "200px"  # same as svg.view_height / view_width
+
+_PATH = SVGTensor.ELEMENTS.index("path")
+_EOS = SVGTensor.ELEMENTS.index("EOS")
+_SOS = SVGTensor.ELEMENTS.index("SOS")
+
+_INT_MIN = -1
+_INT_STRS = np.array([str(i) for i in range(_INT_MIN, 4096)], dtype=object)
+
+
+def format_numbers(x: Union[np.ndarray, torch.Tensor], precision: int = None) -> np.ndarray:
+    """Vectorized shortest formatting of numbers: integers without decimals, others rounded to `precision`."""
+    if isinstance(x, torch.Tensor):
+        x = x.detach().cpu().numpy()
+    x = np.asarray(x)
+    if x.dtype not in (np.float32, np.float64):
+        x = x.astype(np.float64)  # float32 keeps its own shortest representation ("0.1", not "0.10000000149011612")
+    if precision is not None:
+        x = np.round(x, precision)
+    integral = x == np.round(x)
+    out = np.empty(x.shape, dtype=object)
+    out[~integral] = x[~integral].astype(str)
+
+    # numericalized coordinates are small integers: look their strings up instead of formatting them
+    ints = x[integral].astype(np.int64)
+    small = (ints >= _INT_MIN) & (ints < _INT_MIN + len(_INT_STRS))
+    ints_str = np.empty(ints.shape, dtype=object)
+    ints_str[small] = _INT_STRS[ints[small] - _INT_MIN]
+    ints_str[~small] = ints[~small].astype(str)
+    out[integral] = ints_str
+    return out
+
+
+def _float_strs(x) -> np.ndarray:
+    # str(float(v)) of every value, as SVGCommand.to_str / Bbox.to_str print them ("0.0", "24.0", float32 positions
+    # with all their float64 digits: "15.538999557495117", not "15.539")
+    return np.asarray(x, dtype=np.float64).astype(str).astype(object)
+
+
+def _color_attrs(rgba: np.ndarray, nums: np.ndarray, color_attr="fill", PAD_VAL=-1) -> np.ndarray:
+    # rgba: (N, 4) values, nums: (N, 4) formatted values. rgb() / rgba() with rounded and clipped channels as in
+    # Color.to_str, but channels are printed as integers ("255", Color.to_str prints "255.0")
+    rgb = format_numbers(np.clip(np.round(rgba[:, :3]), 0, 255))
+    opaque = rgba[:, 3] == 1.
+    attrs = np.array([f'{color_attr}="rgb({r},{g},{b})" ' if o else f'{color_attr}="rgba({r},{g},{b},{a})" '
+                      for (r, g, b), a, o in zip(rgb, nums[:, 3], opaque)], dtype=object)
+    attrs[(rgba == PAD_VAL).all(axis=-1)] = ""
+    return attrs.reshape(-1)
+
+
+def _command_strs(commands: np.ndarray, nums: np.ndarray) -> np.ndarray:
+    # d tokens of path rows. nums: (N, 19) formatted values
+    Index = SVGTensor.Index
+    c = lambda s: nums[:, s] if isinstance(s, int) else [nums[:, i] for i in range(s.start, s.stop)]
+    (rx, ry), rot, large, sweep = c(Index.RADIUS), c(Index.X_AXIS_ROT), c(Index.LARGE_ARC_FLG), c(Index.SWEEP_FLG)
+    (c1x, c1y), (c2x, c2y), (ex, ey) = c(Index.CONTROL1), c(Index.CONTROL2), c(Index.END_POS)
+
+    out = np.full(len(commands), "", dtype=object)
+    for cmd in SVGTensor.PATH_COMMANDS:
+        idx = np.nonzero(commands == SVGTensor.PATH_COMMANDS.index(cmd))[0]
+        if not len(idx):
+            continue
+        if cmd in "ml":
+            strs = [f"{cmd.upper()}{x} {y}" for x, y in zip(ex[idx], ey[idx])]
+        elif cmd == "c":
+            strs = [f"C{a} {b} {d} {e} {x} {y}" for a, b, d, e, x, y in zip(c1x[idx], c1y[idx], c2x[idx], c2y[idx], ex[idx], ey[idx])]
+        elif cmd == "q":
+            strs = [f"Q{a} {b} {x} {y}" for a, b, x, y in zip(c1x[idx], c1y[idx], ex[idx], ey[idx])]
+        elif cmd == "a":
+            strs = [f"A{a} {b} {r} {l} {s} {x} {y}" for a, b, r, l, s, x, y in
+                    zip(rx[idx], ry[idx], rot[idx], large[idx], sweep[idx], ex[idx], ey[idx])]
+        else:
+            strs = ["Z"] * len(idx)
+        out[idx] = strs
+    return out
+
+
+def _primitive_strs(elements: np.ndarray, values: np.ndarray, nums: np.ndarray, colors: np.ndarray) -> np.ndarray:
+    # non path rows, columns as in the svg_primitives to_tensor methods
+    Index = SVGTensor.Index
+    (rx, ry), (sx, sy) = nums[:, Index.RADIUS].T, nums[:, Index.START_POS].T
+    (c1x, c1y), (c2x, c2y), (ex, ey) = nums[:, Index.CONTROL1].T, nums[:, Index.CONTROL2].T, nums[:, Index.END_POS].T
+    rounded = (values[:, Index.CONTROL2] > 0).any(axis=-1)
+
+    out = np.full(len(elements), "", dtype=object)
+    for i, (e, col) in enumerate(zip(elements, colors)):
+        name = SVGTensor.ELEMENTS[e]
+        if name == "rect":
+            corner = f' rx="{c2x[i]}" ry="{c2y[i]}"' if rounded[i] else ""
+            out[i] = f'<rect {col}x="{sx[i]}" y="{sy[i]}" width="{c1x[i]}" height="{c1y[i]}"{corner}/>'
+        elif name == "circle":
+            out[i] = f'<circle {col}cx="{sx[i]}" cy="{sy[i]}" r="{rx[i]}"/>'
+        elif name == "ellipse":
+            out[i] = f'<ellipse {col}cx="{sx[i]}" cy="{sy[i]}" rx="{rx[i]}" ry="{ry[i]}"/>'
+        elif name == "line":
+            out[i] = f'<line {col}x1="{sx[i]}" y1="{sy[i]}" x2="{ex[i]}" y2="{ey[i]}"/>'
+        elif name in ("polyline", "polygon"):
+            # a row only holds one segment (start_pos, end_pos), points as in SVGPolyline.to_str
+            out[i] = f'<{name} {col}points="{sx[i]} {sy[i]} {ex[i]} {ey[i]}"/>'
+    return out
+
+
+def _get_matrices(samples) -> List[torch.Tensor]:
+    if isinstance(samples, SVGTensorBatch):
+        return [samples.data[i, :int(samples.seq_len[i])] for i in range(len(samples))]
+    if isinstance(samples, (SVGTensor, torch.Tensor)) and (isinstance(samples, SVGTensor) or samples.dim() == 2):
+        samples = [samples]
+    return [s.matrix[:int(s.seq_len)] if isinstance(s, SVGTensor) else s for s in samples]
+
+
+def _serialize(samples, precision: int = None, color_attr="fill", PAD_VAL=-1) -> List[List[tuple]]:
+    # per sample list of ("path", color attribute, d) or ("element", element string)
+    matrices = _get_matrices(samples)
+    lengths = [m.size(0) for m in matrices]
+    out = [[] for _ in matrices]
+    if not sum(lengths):
+        return out
+    data = torch.cat([m.detach().float().cpu() for m in matrices]).numpy()
+    if data.shape[-1] == SVGTensor.Index.RGBA.start:
+        data = np.concatenate([data, np.full((len(data), 4), PAD_VAL, dtype=data.dtype)], axis=-1)
+    sample_ids = np.repeat(np.arange(len(matrices)), lengths)
+
+    Index = SVGTensor.Index
+    keep = (data[:, Index.ELEMENT] != _EOS) & (data[:, Index.ELEMENT] != _SOS)
+    data, sample_ids = data[keep], sample_ids[keep]
+
+    elements, commands = data[:, Index.ELEMENT].astype(np.int64), data[:, Index.COMMAND].astype(np.int64)
+    nums = format_numbers(data, precision)
+    colors = _color_attrs(data[:, Index.RGBA], nums[:, Index.RGBA], color_attr=color_attr, PAD_VAL=PAD_VAL)
+    is_path = (elements == _PATH) & (commands >= 0)
+
+    tokens = _command_strs(commands, nums)
+    others = np.nonzero(~is_path)[0]
+    tokens[others] = _primitive_strs(elements[others], data[others], nums[others], colors[others])
+
+    # consecutive path rows of the same sample and color form one <path>
+    same = np.zeros(len(data), dtype=bool)
+    same[1:] = is_path[1:] & is_path[:-1] & (sample_ids[1:] == sample_ids[:-1]) & (colors[1:] == colors[:-1])
+    starts = np.nonzero(~same)[0]
+    ends = np.append(starts[1:], len(data))
+
+    for s, e in zip(starts, ends):
+        if is_path[s]:
+            out[sample_ids[s]].append(("path", colors[s], " ".join(tokens[s:e])))
+        elif tokens[s]:
+            out[sample_ids[s]].append(("element", tokens[s]))
+    return out
+
+
+def tensors_to_elements(samples, precision: int = None, color_attr="fill", PAD_VAL=-1) -> List[List[str]]:
+    """SVG element strings (<path d=...>, <rect .../>, ...) of every sample.
+
+    Args:
+        samples: SVGTensorBatch, SVGTensor, (L, 19) tensor or a list of SVGTensor / (L, 19) tensors.
+        precision: decimals of coordinates (None: shortest representation).
+        color_attr: "fill" or "stroke" for the RGBA columns (PAD rgba: no attribute).
+    """
+    return [[f'<path {item[1]}d="{item[2]}"></path>' if item[0] == "path" else item[1] for item in sample]
+            for sample in _serialize(samples, precision=precision, color_attr=color_attr, PAD_VAL=PAD_VAL)]
+
+
+def to_d_strings(samples, precision: int = None) -> List[List[str]]:
+    """Compact path data (d attribute) strings of every sample, one per <path>."""
+    return [[item[2] for item in sample if item[0] == "path"] for sample in _serialize(samples, precision=precision)]
+
+
+def _svg_header(viewbox: Bbox, precision=None, shortest=True):
+    numbers = [*viewbox.xy.pos, *viewbox.wh.pos]
+    x, y, w, h = format_numbers(numbers, precision) if shortest or precision is not None else _float_strs(numbers)
+    return f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="{x} {y} {w} {h}" height="{VIEW_SIZE}" width="{VIEW_SIZE}">\n\n'
+
+
+def tensors_to_svg_strs(samples, viewbox: Bbox = None, precision: int = None, color_attr="fill", ARGS_DIM=256) -> List[str]:
+    """SVG documents of every sample (viewbox defaults to the numericalized range Bbox(ARGS_DIM))."""
+    header = _svg_header(viewbox if viewbox is not None else Bbox(ARGS_DIM))
+    return [header + "".join(e + "\n" for e in elements) + "</svg>"
+            for elements in tensors_to_elements(samples, precision=precision, color_attr=color_attr)]
+
+
+def tensor_to_svg_str(sample: Union[SVGTensor, torch.Tensor], *args, **kwargs) -> str:
+    return tensors_to_svg_strs([sample], *args, **kwargs)[0]
+
+
+def write_svgs(samples: Iterable, out_dir, batch_size=1024, name_format="{:06d}.svg", **kwargs) -> List[str]:
+    """Streaming dump of SVGTensor / (L, 19) samples (or SVGTensorBatch items of an iterable) to svg files.
+
+    Samples are serialized `batch_size` at a time, so memory does not grow with the number of samples.
+
+    Returns:
+        list of written file paths.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    file_paths, buffer = [], []
+
+    def flush():
+        for svg_str in tensors_to_svg_strs(buffer, **kwargs):
+            file_path = os.path.join(out_dir, name_format.format(len(file_paths)))
+            with open(file_path, "w") as f:
+                f.write(svg_str)
+            file_paths.append(file_path)
+        buffer.clear()
+
+    for sample in samples:
+        buffer.extend(_get_matrices(sample))
+        if len(buffer) >= batch_size:
+            flush()
+    if buffer:
+        flush()
+    return file_paths
+
+
+######### SVG objects
+def _command_letters_and_numbers(paths, with_starts=False):
+    # flat numbers of all commands with, for every number, its axis (0: x, 1: y, -1: not a position, -2: flag)
+    letters, counts, numbers, axes, starts, path_sizes = [], [], [], [], [], []
+    for path in paths:
+        commands = path.all_commands()
+        path_sizes.append(len(commands))
+        for command in commands:
+            letters.append(command.command._value_)
+            if with_starts:
+                starts.append(command.start_pos.pos)
+            nb = len(numbers)
+            for arg in command.args:
+                t = type(arg)
+                if t is Point:
+                    numbers.extend(arg.pos.tolist())
+                    axes.extend((0, 1))
+                elif t is Radius:
+                    numbers.extend(arg.pos.tolist())
+                    axes.extend((-1, -1))
+                elif t is Angle:
+                    numbers.append(arg.deg)
+                    axes.append(-1)
+                elif t is Flag:
+                    numbers.append(arg.flag)
+                    axes.append(-2)
+                elif isinstance(arg, Coord):
+                    numbers.append(arg.coord)
+                    axes.append(0 if arg.xy == Coord.XY.X else 1)
+                elif isinstance(arg, Point):
+                    numbers.extend(arg.pos.tolist())
+                    axes.extend((0, 1))
+            counts.append(len(numbers) - nb)
+    # float64: the float32 positions and the float angles are kept exactly (str(float) output)
+    return letters, counts, np.array(numbers, dtype=np.float64), np.array(axes, dtype=np.int64), starts, path_sizes
+
+
+def _compact_number(s: str) -> str:
+    if s.startswith("0."):
+        return s[1:]
+    if s.startswith("-0."):
+        return "-" + s[2:]
+    return s
+
+
+def path_d_strings(paths, precision: int = None, relative=False, compact=False) -> List[str]:
+    """d attributes of SVGPath objects, with all numbers formatted in one vectorized call.
+
+    Args:
+        precision: decimals (None: str(float) of every number like SVGCommand.to_str, or the shortest
+            representation with compact).
+        relative: relative (lowercase) commands, positions relative to the start point of every command.
+        compact: drop separators that are not needed (before "-" and after command letters) and leading zeros.
+    """
+    letters, counts, numbers, axes, starts, path_sizes = _command_letters_and_numbers(paths, with_starts=relative)
+    if not letters:
+        return ["" for _ in paths]
+
+    if relative:
+        # the first command of every <path> starts from (0, 0) and stays absolute
+        first = np.zeros(len(letters), dtype=bool)
+        first[np.cumsum([0, *path_sizes[:-1]])[np.array(path_sizes) > 0]] = True
+        cmd_ids = np.repeat(np.arange(len(letters)), counts)
+        starts = np.stack(starts).astype(np.float32)
+        is_pos = (axes >= 0) & ~first[cmd_ids]
+        numbers[is_pos] -= starts[cmd_ids[is_pos], axes[is_pos]]
+        letters = [l.upper() if f else l.lower() for l, f in zip(letters, first)]
+    else:
+        letters = [l.upper() for l in letters]
+
+    if precision is None and not compact:
+        strs = _float_strs(numbers)
+        flags = axes == -2
+        strs[flags] = format_numbers(numbers[flags])
+        strs = strs.tolist()
+    else:
+        strs = format_numbers(numbers.astype(np.float32), precision).tolist()
+    if compact:
+        strs = [_compact_number(x) for x in strs]
+
+    tokens, i = [], 0
+    for letter, count in zip(letters, counts):
+        args = strs[i:i + count]
+        i += count
+        if compact:
+            token = letter
+            for k, arg in enumerate(args):
+                token += arg if k == 0 or arg[0] == "-" or (arg[0] == "." and "." in args[k - 1]) else " " + arg
+            tokens.append(token)
+        else:
+            tokens.append(letter + " ".join(args))
+
+    sep = "" if compact else " "
+    out, j = [], 0
+    for size in path_sizes:
+        out.append(sep.join(tokens[j:j + size]))
+        j += size
+    return out
+
+
+def _color_text(geom, cache: dict) -> str:
+    # SVGGeometry._get_color_text, memoized on the color values
+    fill, stroke = geom.fill, getattr(geom, "stroke", None)
+    key = (None if not fill else (fill.rgb.tobytes(), float(fill.a)),
+           None if not stroke else (stroke.rgb.tobytes(), float(stroke.a), str(geom.stroke_width)))
+    if key not in cache:
+        cache[key] = geom._get_color_text()
+    return cache[key]
+
+
+def iter_svg_str(svg, precision: int = None, relative=False, compact=False, chunk_size=1024, with_points=False,
+                 with_handles=False, with_bboxes=False, with_markers=False, color_firstlast=False, with_moves=True) -> Iterator[str]:
+    """Generator of the fragments of svg.to_str(). Paths are formatted `chunk_size` at a time."""
+    yield _svg_header(svg.viewbox, precision, shortest=compact)
+    if with_markers:
+        yield svg._markers()
+
+    viz_elements = svg._get_viz_elements(with_points, with_handles, with_bboxes, color_firstlast, with_moves)
+    marker_attr = 'marker-start="url(#arrow)"' if with_markers else ''
+    colors = {}
+
+    chunk = []  # (fill attribute of the group, path)
+
+    def flush():
+        d_strings = path_d_strings([path for _, path in chunk], precision=precision, relative=relative, compact=compact)
+        fragment = "".join(f'<path {_color_text(path, colors) or fill_attr} {marker_attr} d="{d}"></path>\n'
+                           for (fill_attr, path), d in zip(chunk, d_strings))
+        chunk.clear()
+        return fragment
+
+    for group in [*svg.svg_path_groups, *viz_elements]:
+        if hasattr(group, "svg_paths"):
+            fill_attr = _color_text(group, colors)
+            chunk.extend((fill_attr, path) for path in group.svg_paths)
+            if len(chunk) >= chunk_size:
+                yield flush()
+        else:
+            if chunk:
+                yield flush()
+            yield group.to_str(with_markers=with_markers)
+    if chunk:
+        yield flush()
+    yield "</svg>"
+
+
+def write_svg(svg, file: Union[str, IO], buffer_size=1 << 16, **kwargs):
+    """Stream svg.to_str() to a file path or an open text file through a buffered writer."""
+    if isinstance(file, str):
+        with open(file, "w", buffering=buffer_size) as f:
+            f.writelines(iter_svg_str(svg, **kwargs))
+    else:
+        file.writelines(iter_svg_str(svg, **kwargs))
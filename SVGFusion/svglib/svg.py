@@ -3,15 +3,11 @@ from .geom import *
 from xml.dom import expatbuilder
 import torch
 from typing import List, Union
-import IPython.display as ipd
-import cairosvg
-from PIL import Image
 import io
 import os
-from moviepy.editor import ImageClip, concatenate_videoclips, ipython_display
 import math
 import random
-import networkx as nx
+# NOTE: IPython / cairosvg / PIL / networkx は重いので使う関数の中で import する (worker の起動時間を短くするため)
 
 Num = Union[int, float]
 
@@ -202,11 +198,12 @@ class SVG:
         svg = SVG([SVGPath.from_tensor(t, allow_empty=allow_empty) for t in tensors], viewbox=viewbox)
         return svg
 
-    def save_svg(self, file_path):
-        with open(file_path, "w") as f:
-            f.write(self.to_str())
+    def save_svg(self, file_path, **kwargs):
+        from .serialize import write_svg
+        write_svg(self, file_path, **kwargs)
 
     def save_png(self, file_path):
+        import cairosvg
         cairosvg.svg2png(bytestring=self.to_str(), write_to=file_path)
 
     def draw(self, file_path=None, do_display=True, return_png=False, with_points=False, with_handles=False, with_bboxes=False, with_markers=False, color_firstlast=False, with_moves=True):
@@ -228,9 +225,12 @@ class SVG:
                               with_moves=with_moves)
 
         if do_display:
+            import IPython.display as ipd
             ipd.display(ipd.SVG(svg_str))
 
         if return_png:
+            import cairosvg
+            from PIL import Image
             if file_path is None:
                 img_data = cairosvg.svg2png(bytestring=svg_str)
                 return Image.open(io.BytesIO(img_data))
@@ -266,14 +266,12 @@ class SVG:
                 '</defs>')
 
     def to_str(self, with_points=False, with_handles=False, with_bboxes=False, with_markers=False,
-               color_firstlast=False, with_moves=True) -> str:
-        viz_elements = self._get_viz_elements(with_points, with_handles, with_bboxes, color_firstlast, with_moves)
-        # newline = "\n"
-        return (
-            f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="{self.viewbox.to_str()}" height="{view_height}" width="{view_width}">\n\n'
-            f'{self._markers() if with_markers else ""}'
-            f'{"".join(svg_path_group.to_str(with_markers=with_markers) for svg_path_group in [*self.svg_path_groups, *viz_elements])}'
-            '</svg>')
+               color_firstlast=False, with_moves=True, precision=None, relative=False, compact=False) -> str:
+        """SVG document string. See serialize.iter_svg_str for precision / relative / compact."""
+        from .serialize import iter_svg_str
+        return "".join(iter_svg_str(self, precision=precision, relative=relative, compact=compact, with_points=with_points,
+                                    with_handles=with_handles, with_bboxes=with_bboxes, with_markers=with_markers,
+                                    color_firstlast=color_firstlast, with_moves=with_moves))
 
     def _apply_to_paths(self, method, *args, **kwargs):
         for path_group in self.svg_path_groups:
@@ -403,35 +401,43 @@ class SVG:
 
         return self
 
-    def to_video(self, wrapper, color="grey"):
-        clips, svg_commands = [], []
+    def to_video(self, wrapper, color="grey", **kwargs):
+        """wrapper applied to every frame of animate.progress_frames (kwargs are passed there).
 
-        im = SVG([]).draw(do_display=False, return_png=True)
-        clips.append(wrapper(np.array(im)))
+        Frames are opaque (H, W, 4) uint8 RGBA arrays, as the former PIL renderings.
+        """
+        from .animate import progress_frames
+        frames = progress_frames(self, color=color, **kwargs)
+        return [wrapper(np.dstack([frame, np.full(frame.shape[:2], 255, dtype=np.uint8)])) for frame in frames]
 
-        for svg_path in self.paths:
-            clips, svg_commands = svg_path.to_video(wrapper, clips, svg_commands, color=color)
-
-        im = self.draw(do_display=False, return_png=True)
-        clips.append(wrapper(np.array(im)))
-
-        return clips
-
-    def animate(self, file_path=None, frame_duration=0.1, do_display=True):
-        clips = self.to_video(lambda img: ImageClip(img).set_duration(frame_duration))
-
-        clip = concatenate_videoclips(clips, method="compose", bg_color=(255, 255, 255))
+    def animate(self, file_path=None, frame_duration=0.1, do_display=True, **kwargs):
+        from .animate import progress_frames, encode_gif
+        gif = encode_gif(progress_frames(self, **kwargs), frame_duration=frame_duration)
 
         if file_path is not None:
-            clip.write_gif(file_path, fps=24, verbose=False, logger=None)
+            with open(file_path, "wb") as f:
+                f.write(gif)
 
         if do_display:
-            src = clip if file_path is None else file_path
-            ipd.display(ipython_display(src, fps=24, rd_kwargs=dict(logger=None), autoplay=1, loop=1))
-
-    def numericalize(self, n=256):
+            import IPython.display as ipd
+            ipd.display(ipd.Image(data=gif, format="gif"))
+
+    def fingerprint(self, tolerance=None, quantize=None, **kwargs) -> str:
+        """Content hash of the geometry, colors and viewbox (see fingerprint.fingerprint)."""
+        from .fingerprint import fingerprint
+        return fingerprint(self, tolerance=tolerance, quantize=quantize, **kwargs)
+
+    def numericalize(self, n=256, rounding="round", seed=None, return_error=False):
+        """Normalize to Bbox(n) and quantize all coordinates, radii, angles and flags in one vectorized pass.
+
+        Args:
+            rounding: one of quantize.ROUNDING_MODES.
+            return_error: return the quantization error report (see quantize.numericalize_svg) instead of self.
+        """
+        from .quantize import numericalize_svg
         self.normalize(viewbox=Bbox(n))
-        return self._apply_to_paths("numericalize", n)
+        report = numericalize_svg(self, n, rounding=rounding, seed=seed)
+        return report if return_error else self
 
     def simplify(self, tolerance=0.1, epsilon=0.1, angle_threshold=179., force_smooth=False):
         self._apply_to_paths("simplify", tolerance=tolerance, epsilon=epsilon, angle_threshold=angle_threshold,
@@ -531,6 +537,7 @@ class SVG:
         return union_bbox([path_group.bbox() for path_group in self.svg_path_groups])
 
     def overlap_graph(self, threshold=0.95, draw=False):
+        import networkx as nx
         G = nx.DiGraph()
         shapes = [group.to_shapely() for group in self.svg_path_groups]
 
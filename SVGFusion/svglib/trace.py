@@ -0,0 +1,301 @@
+from __future__ import annotations
+import argparse
+import functools
+import importlib
+import json
+import os
+import runpy
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List
+
+# NOTE: 前処理パイプラインの計測 (どこが遅いかを調べる用、既定では無効)。
+# enable() で TARGETS のメソッド / 関数を計測用のラッパーに差し替え、disable() で元に戻す。
+# 無効の間はラッパーが存在しないので、計測のコストは 0 (span() / count() を直接呼ぶ場合だけ関数呼び出し 1 回分)。
+#   span    : 入れ子の区間 (開始時刻, 長さ, 子を除いた長さ)。Chrome trace の "X" イベントと、名前ごとの集計
+#   counter : command 数、弧 -> ベジェ変換、shapely の呼び出し、キャッシュのヒット / ミス
+# export_chrome_trace() の JSON は chrome://tracing や https://ui.perfetto.dev で開ける。
+# モジュールの関数 (rasterize など) はモジュールの属性を差し替えるので、enable() 前に from ... import した名前経由の呼び出しは計測されない。
+# 計測するのはこのプロセスだけ (プロセスプールの worker の区間は記録されない、調べるときは num_workers=0 で実行する)。
+#   python -m SVGFusion.svglib.trace -o trace.json script.py args...
+
+MAX_EVENTS = 1_000_000   # later spans are only aggregated
+
+
+def _nb_commands(svg) -> int:
+    return sum(len(path.path_commands) for group in svg.svg_path_groups for path in getattr(group, "svg_paths", []))
+
+
+def _nb_rows(tensor) -> int:
+    return sum(len(t) for t in tensor) if isinstance(tensor, list) else len(tensor)
+
+
+# (module, attribute, span, counter(result, args) -> {name: n})
+TARGETS = [
+    # loaders
+    (".svg", "SVG.load_svg", True, None),
+    (".svg", "SVG.from_str", True, lambda res, args: {"commands.parsed": _nb_commands(res)}),
+    (".svg", "SVG.load_splineset", True, None),
+    ("..difflib.dataset", "write_svg_shards", True, None),
+    ("..difflib.dataset", "SVGTensorDataset.__getitem__", True, None),
+    ("..difflib.cache", "cached_to_tensor", True, None),
+    ("..difflib.cache", "cached_to_tensors", True, None),
+    # SVG methods
+    (".svg", "SVG.canonicalize", True, lambda res, args: {"commands.canonicalized": _nb_commands(args[0])}),
+    (".svg", "SVG.to_path", True, None),
+    (".svg", "SVG.simplify_arcs", True, None),
+    (".svg", "SVG.compute_filling", True, None),
+    (".svg", "SVG.normalize", True, None),
+    (".svg", "SVG.numericalize", True, None),
+    (".svg", "SVG.split_paths", True, None),
+    (".svg", "SVG.filter_consecutives", True, None),
+    (".svg", "SVG.filter_duplicates", True, None),
+    (".svg", "SVG.reorder", True, None),
+    (".svg", "SVG.simplify", True, None),
+    (".svg", "SVG.simplify_heuristic", True, None),
+    (".svg", "SVG.split", True, None),
+    (".svg", "SVG.bbox", True, None),
+    (".svg", "SVG.overlap_graph", True, None),
+    (".svg", "SVG.to_points", True, None),
+    (".svg", "SVG.fingerprint", True, None),
+    (".svg", "SVG.to_tensor", True, lambda res, args: {"commands.tensorized": _nb_rows(res)}),
+    (".svg", "SVG.from_tensor", True, None),
+    (".svg", "SVG.from_tensors", True, None),
+    (".raster", "rasterize", True, None),
+    (".dedup", "compute_signatures", True, None),
+    # counters only (called too often for a span each)
+    (".graphics.geometry.svg_command", "SVGCommandArc.to_beziers", False,
+     lambda res, args: {"arcs.converted": 1, "arcs.beziers": len(res)}),
+    (".graphics.geometry.svg_path", "SVGPath.to_shapely", False, lambda res, args: {"shapely.polygons": 1}),
+    (".graphics.geometry.svg_primitives", "SVGPathGroup.to_shapely", False, lambda res, args: {"shapely.unions": 1}),
+    ("..difflib.cache", "PipelineCache.get_tensor", False,
+     lambda res, args: {"cache.hits" if res is not None else "cache.misses": 1}),
+    ("..difflib.cache", "PipelineCache.get_svg", False,
+     lambda res, args: {"cache.hits" if res is not None else "cache.misses": 1}),
+]
+
+
+class _State:
+    def __init__(self, max_events=MAX_EVENTS):
+        self.max_events = max_events
+        self.t0 = time.perf_counter_ns()
+        self.events = []              # (name, start ns, duration ns, thread id)
+        self.dropped = 0
+        self.stats = {}               # name -> [calls, total ns, self ns, max ns]
+        self.counters = {}
+        self.local = threading.local()
+
+    def stack(self) -> list:
+        # child durations of the open spans of this thread
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def close(self, name, start, stack):
+        duration = time.perf_counter_ns() - start
+        children = stack.pop()
+        if stack:
+            stack[-1] += duration
+
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = [0, 0, 0, 0]
+        stats[0] += 1
+        stats[1] += duration
+        stats[2] += duration - children
+        stats[3] = max(stats[3], duration)
+
+        if len(self.events) < self.max_events:
+            self.events.append((name, start, duration, threading.get_ident()))
+        else:
+            self.dropped += 1
+
+    def count(self, counts: Dict[str, int]):
+        for name, n in counts.items():
+            self.counters[name] = self.counters.get(name, 0) + n
+
+
+_state: _State = None   # while enabled
+_last: _State = None    # results of the last enable()
+_originals = []   # (owner, attribute, original value or None if inherited)
+
+
+def _wrap(func, name, span, counter):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        state = _state
+        if state is None:
+            return func(*args, **kwargs)
+        if span:
+            stack = state.stack()
+            stack.append(0)
+            start = time.perf_counter_ns()
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                state.close(name, start, stack)
+        else:
+            result = func(*args, **kwargs)
+        if counter is not None:
+            state.count(counter(result, args))
+        return result
+    return wrapper
+
+
+def _install():
+    for module_name, attribute, span, counter in TARGETS:
+        module = importlib.import_module(module_name, __package__)
+        *owner_names, name = attribute.split(".")
+        owner = module
+        for owner_name in owner_names:
+            owner = getattr(owner, owner_name)
+
+        original = vars(owner).get(name)
+        value = original if original is not None else getattr(owner, name)
+        if isinstance(value, staticmethod):
+            wrapped = staticmethod(_wrap(value.__func__, attribute, span, counter))
+        else:
+            wrapped = _wrap(value, attribute, span, counter)
+        setattr(owner, name, wrapped)
+        _originals.append((owner, name, original))
+
+
+def _uninstall():
+    while _originals:
+        owner, name, original = _originals.pop()
+        if original is None:
+            delattr(owner, name)
+        else:
+            setattr(owner, name, original)
+
+
+def enable(max_events=MAX_EVENTS):
+    """Start recording (clears previous results)."""
+    global _state, _last
+    if not _originals:
+        try:
+            _install()
+        except Exception:
+            _uninstall()
+            raise
+    _state = _last = _State(max_events)
+
+
+def disable():
+    """Stop recording and restore the original methods. Recorded results are kept until the next enable()."""
+    global _state
+    _uninstall()
+    _state = None
+
+
+def is_enabled() -> bool:
+    return _state is not None
+
+
+def span(name: str):
+    """Context manager recording a span around user code (loaders, training steps...) while enabled."""
+    if _state is None:
+        return nullcontext()
+    return _span(name)
+
+
+@contextmanager
+def _span(name):
+    state = _state
+    stack = state.stack()
+    stack.append(0)
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        state.close(name, start, stack)
+
+
+def count(name: str, n=1):
+    """Add n to counter name while enabled."""
+    if _state is not None:
+        _state.count({name: n})
+
+
+def counters() -> Dict[str, int]:
+    return dict(_last.counters) if _last is not None else {}
+
+
+def summary() -> List[dict]:
+    """Aggregated spans, by decreasing total time (seconds)."""
+    if _last is None:
+        return []
+    rows = [{"name": name, "calls": calls, "total": total / 1e9, "self": self_time / 1e9, "mean": total / calls / 1e9,
+             "max": max_time / 1e9}
+            for name, (calls, total, self_time, max_time) in _last.stats.items()]
+    return sorted(rows, key=lambda row: -row["total"])
+
+
+def format_summary() -> str:
+    lines = [f"{'span':40s} {'calls':>9s} {'total':>10s} {'self':>10s} {'mean':>10s} {'max':>10s}"]
+    for row in summary():
+        lines.append(f"{row['name']:40s} {row['calls']:9d} {row['total'] * 1e3:8.1f}ms {row['self'] * 1e3:8.1f}ms "
+                     f"{row['mean'] * 1e3:8.3f}ms {row['max'] * 1e3:8.1f}ms")
+    for name, n in sorted(counters().items()):
+        lines.append(f"{name:40s} {n:9d}")
+    if _last is not None and _last.dropped:
+        lines.append(f"({_last.dropped} spans aggregated but not kept in the trace)")
+    return "\n".join(lines)
+
+
+def chrome_trace() -> dict:
+    """Recorded spans and counters in the Chrome trace event format."""
+    if _last is None:
+        return {"traceEvents": []}
+    pid, t0 = os.getpid(), _last.t0
+    events = [{"name": name, "cat": name.split(".")[0], "ph": "X", "ts": (start - t0) / 1e3, "dur": duration / 1e3,
+               "pid": pid, "tid": tid}
+              for name, start, duration, tid in _last.events]
+    if _last.counters:
+        end = max((e["ts"] + e["dur"] for e in events), default=0.)
+        events.append({"name": "counters", "ph": "C", "ts": end, "pid": pid, "args": dict(_last.counters)})
+    return {"traceEvents": events, "displayTimeUnit": "ms",
+            "otherData": {"counters": dict(_last.counters), "dropped_spans": _last.dropped}}
+
+
+def export_chrome_trace(file_path):
+    with open(file_path, "w") as f:
+        json.dump(chrome_trace(), f)
+
+
+@contextmanager
+def tracing(file_path=None, max_events=MAX_EVENTS):
+    """Record the spans of the with block, and write the Chrome trace to file_path (if given) at the end."""
+    enable(max_events)
+    try:
+        yield
+    finally:
+        disable()
+        if file_path is not None:
+            export_chrome_trace(file_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a python script with the SVGFusion pipeline instrumented.")
+    parser.add_argument("-o", "--output", default="trace.json", help="Chrome trace output file")
+    parser.add_argument("-m", dest="module", action="store_true", help="run a module (like python -m)")
+    parser.add_argument("script", help="script path, or module name with -m")
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+
+    sys.argv = [args.script, *args.args]
+    try:
+        with tracing(args.output):
+            if args.module:
+                runpy.run_module(args.script, run_name="__main__", alter_sys=True)
+            else:
+                runpy.run_path(args.script, run_name="__main__")
+    finally:
+        print(format_summary(), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+import copy
+import pytest
+from SVGFusion.difflib.cache import PipelineCache, cached_to_tensor, content_hash
+from SVGFusion.svglib.svg import SVG
+
+CIRCLE = '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24"><circle cx="12" cy="12" r="6" fill="red"/></svg>'
+
+
+def test_primitive_and_its_path_do_not_share_entries(tmp_path):
+    cache = PipelineCache(str(tmp_path))
+    circle = SVG.from_str(CIRCLE)
+    path = copy.deepcopy(circle).to_path()
+    assert content_hash(circle) != content_hash(path)
+
+    # with the path document cached, the circle gives the same result as running the stages directly
+    cached_to_tensor(path, cache, numericalize={"n": 256})
+    with pytest.raises(AttributeError):
+        copy.deepcopy(circle).numericalize(n=256)
+    with pytest.raises(AttributeError):
+        cached_to_tensor(circle, cache, numericalize={"n": 256})
@@ -0,0 +1,17 @@
+import torch
+from SVGFusion.difflib.compact import CompactSVGTensors, ALPHA_SCALE
+from SVGFusion.difflib.tensor import SVGTensor
+from SVGFusion.main.neural_path import random_matrices
+
+
+def test_pack_unpack_fractional_alpha():
+    matrices = random_matrices(8, seed=1)
+    alpha = SVGTensor.Index.RGBA.stop - 1
+    for m, a in zip(matrices, torch.linspace(0.05, 1., len(matrices))):
+        m[:, alpha] = a  # not multiples of 1 / 255 (e.g. fill-opacity="0.3")
+
+    unpacked = CompactSVGTensors.pack(matrices).unpack()
+
+    for m, u in zip(matrices, unpacked):
+        assert torch.equal(u[:, :alpha], m[:, :alpha])
+        assert torch.allclose(u[:, alpha], m[:, alpha], atol=0.5 / ALPHA_SCALE)
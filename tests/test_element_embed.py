@@ -0,0 +1,14 @@
+import torch
+from SVGFusion.difflib.element_embed import SVGElementEmbedding
+from SVGFusion.difflib.tensor import SVGTensor
+
+
+def test_x_axis_rot_wraps_to_the_first_bin():
+    embed = SVGElementEmbedding(8)
+    rot = SVGTensor.Index.X_AXIS_ROT
+    data = torch.full((4, 19), -1.)
+    data[:, rot] = torch.tensor([0., 359.5, 360., -0.2])
+
+    indices, weights = embed.quantize(data)
+    assert (indices[:, rot] == embed.offsets[rot]).all()
+    assert (weights[:, rot] == 1).all()
@@ -0,0 +1,13 @@
+import copy
+from SVGFusion.svglib.svg import SVG
+
+CIRCLE = '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24"><circle cx="12" cy="12" r="6" fill="red"/></svg>'
+
+
+def test_circle_and_its_path_fingerprint_differently():
+    circle = SVG.from_str(CIRCLE)
+    path = SVG.from_str(CIRCLE).to_path()
+
+    assert circle.fingerprint() != path.fingerprint()
+    assert circle.fingerprint() == SVG.from_str(CIRCLE).fingerprint()
+    assert copy.deepcopy(circle).to_path().fingerprint() == path.fingerprint()
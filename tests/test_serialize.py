@@ -0,0 +1,19 @@
+from SVGFusion.svglib.svg import SVG
+
+DOC = '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24"><path d="M15.539 8.08 L10.5 3.1 A3 3 30.2 0 1 7 7 Z"/></svg>'
+
+
+def test_to_str_default_format():
+    # str(float) of every number as the per-command to_str, flags as integers
+    assert SVG.from_str(DOC).to_str() == (
+        '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0.0 0.0 24.0 24.0" height="200px" width="200px">\n\n'
+        '<path fill="rgb(0.0,0.0,0.0)"   d="M0.0 0.0 M15.538999557495117 8.079999923706055 L10.5 3.0999999046325684 '
+        'A3.0 3.0 30.2 0 1 7.0 7.0 Z"></path>\n'
+        '</svg>')
+
+
+def test_to_str_matches_command_to_str():
+    svg = SVG.from_str(DOC)
+    d = " ".join(command.to_str() for path in svg.paths for command in path.all_commands())
+    assert f'd="{d}"' in svg.to_str()
+    assert f'viewBox="{svg.viewbox.to_str()}"' in svg.to_str()
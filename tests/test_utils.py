@@ -0,0 +1,18 @@
+import os
+import pytest
+from SVGFusion.difflib.utils import atomic_write
+
+
+def test_atomic_write_removes_the_temporary_file_on_error(tmp_path):
+    file_path = str(tmp_path / "out.bin")
+    atomic_write(file_path, lambda f: f.write(b"old"))
+
+    def fail(f):
+        f.write(b"partial")
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        atomic_write(file_path, fail)
+    assert os.listdir(tmp_path) == ["out.bin"]
+    with open(file_path, "rb") as f:
+        assert f.read() == b"old"